@@ -2,7 +2,7 @@ from PyQt6.QtWidgets import QApplication, QWidget, QVBoxLayout, QHBoxLayout, QFi
 from config import load_config, save_config
 from .elements import get_elements
 from modules.browser_manager import BrowserManager
-from modules.workflow_manager import WorkflowThread
+from modules.workflow_manager import WorkflowThread, read_title_rows, select_pending_titles
 import sys
 import json
 import os
@@ -130,7 +130,7 @@ class MainWindow(QWidget):
             e['model_detail_combo'].addItems(list(self.model_map[platform].keys()))
 
     def choose_title_file(self):
-        path, _ = QFileDialog.getOpenFileName(self, '选择标题文件', '', 'Excel Files (*.xlsx *.xls)')
+        path, _ = QFileDialog.getOpenFileName(self, '选择标题文件', '', 'Excel/CSV Files (*.xlsx *.xls *.csv)')
         if path:
             self.elements['title_path_edit'].setText(path)
 
@@ -182,21 +182,13 @@ class MainWindow(QWidget):
 
         # 简单检查Excel文件是否有内容
         try:
-            import pandas as pd
-            df = pd.read_excel(title_path, header=None, usecols=[0])
-            titles = df[0].dropna().astype(str).tolist()
-            if not titles:
+            rows = read_title_rows(title_path)
+            if not any(title is not None for title, _ in rows):
                 QMessageBox.warning(self, "提示", "Excel文件中没有找到任何标题。")
                 return
             
-            # 检查是否有未完成的任务
-            if len(df.columns) >= 2:
-                # 检查第二列的状态
-                statuses = df[1].fillna('').astype(str).tolist()
-                pending_count = sum(1 for i, status in enumerate(statuses) if i < len(titles) and status != "已完成文章创作")
-            else:
-                # 没有状态列，所有任务都是待处理的
-                pending_count = len(titles)
+            # 检查是否有未完成的任务（没有状态的任务视为待处理）
+            pending_count = len(select_pending_titles(rows))
             
             if pending_count == 0:
                 QMessageBox.information(self, "提示", "所有任务都已完成，没有待处理的任务。")
@@ -215,7 +207,7 @@ class MainWindow(QWidget):
             'model_detail': e['model_detail_combo'].currentText(),
             'model_url': self.model_map.get(e['model_combo'].currentText(), {}).get(e['model_detail_combo'].currentText(), ''),
             'model_config_path': self.config.get('model_config_path', 'model_config.json'),
-            'title_path': e['title_path_edit'].text(),
+            'title_path': title_path,
             'save_path': e['save_path_edit'].text(),
             'prompt': e['prompt_edit'].toPlainText(),
             'min_word_count': e['min_word_count_spin'].value(),
@@ -232,7 +224,8 @@ class MainWindow(QWidget):
         
         try:
             # 工作流线程现在自己管理BrowserManager，我们只需要传递配置
-            self.workflow_thread = WorkflowThread(config)
+            # 把上面检查时已读出的标题行交给工作流，避免再次读取标题文件
+            self.workflow_thread = WorkflowThread(config, title_rows=rows)
             self.workflow_thread.log_signal.connect(self.update_log)
             # 连接自定义的finished和error信号
             self.workflow_thread.finished.connect(self.on_workflow_finished)
@@ -1,3 +1,5 @@
+import logging
+
 from gui.gui_main import run_gui
 
 # 主流程需传递model、model_detail和model_url参数到model_operator
@@ -5,4 +7,6 @@ from gui.gui_main import run_gui
 # 支持模型配置文件动态加载
 
 if __name__ == "__main__":
+    # 全局日志配置只在程序入口执行一次
+    logging.basicConfig(level=logging.INFO)
     run_gui() 
\ No newline at end of file
@@ -0,0 +1,70 @@
+# modules/automator_utils.py
+"""
+自动化器通用工具
+供 MonicaAutomator、PoeAutomator 和 ToutiaoScraper 共用
+"""
+
+import os
+import sys
+import json
+import functools
+from typing import Set
+
+try:
+    import orjson  # 解析速度更快；未安装时回退到标准库json
+except ImportError:
+    orjson = None
+
+# 已确认存在的附件路径。批量创作时同一附件会被反复检查，每个路径只在首次确认时stat一次。
+# 缓存在进程生命周期内有效，不跟踪之后的删除或修改；上传失败时调用 forget_file 移除对应条目，下次重新stat
+_EXISTING_FILES: Set[str] = set()
+
+# 统计字数时需要删除的字符：空格和换行（与最初两个平台的统计口径一致）
+_WHITESPACE_TABLE = str.maketrans('', '', ' \n')
+
+
+def count_chars(text: str) -> int:
+    """统计去除空格和换行后的字符数，两个平台的最少字数判断使用同一口径"""
+    return len(text.translate(_WHITESPACE_TABLE))
+
+
+def file_exists_cached(path: str) -> bool:
+    """判断文件是否存在，已确认存在的路径直接命中缓存"""
+    if path in _EXISTING_FILES:
+        return True
+    if not os.path.exists(path):
+        return False
+    _EXISTING_FILES.add(path)
+    return True
+
+
+def forget_file(path: str) -> None:
+    """移除路径的缓存记录，下次检查时重新访问文件系统"""
+    _EXISTING_FILES.discard(path)
+
+
+def _intern_keys(config: dict) -> dict:
+    """
+    驻留选择器与超时配置中的键。JSON解析出的键不会自动驻留，
+    驻留后与代码中的字面量键为同一对象，字典查找可直接走身份比较的快速路径。
+    """
+    selectors = config.get('selectors')
+    if isinstance(selectors, dict):
+        for group, mapping in selectors.items():
+            if isinstance(mapping, dict):
+                selectors[group] = {sys.intern(k): v for k, v in mapping.items()}
+    timeouts = config.get('timeouts')
+    if isinstance(timeouts, dict):
+        config['timeouts'] = {sys.intern(k): v for k, v in timeouts.items()}
+    return config
+
+
+@functools.lru_cache(maxsize=8)
+def load_config_cached(config_path: str, mtime: float) -> dict:
+    """
+    读取并解析配置文件；以 (路径, 修改时间) 为键缓存，文件被修改后自动失效。
+    返回的是缓存对象本身，调用方需要修改时应先深拷贝。
+    """
+    with open(config_path, 'rb') as f:
+        data = f.read()
+    return _intern_keys(orjson.loads(data) if orjson else json.loads(data))
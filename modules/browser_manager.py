@@ -4,6 +4,33 @@ import logging
 from typing import Optional, List, Any
 from playwright.async_api import async_playwright, Browser, Page, Playwright, Locator
 
+# 在页面中注册 window.__xpEval(selector, context)：按选择器字符串缓存
+# document.createExpression 编译好的XPath表达式，重复查询时无需再次解析。
+# 返回 ORDERED_NODE_SNAPSHOT_TYPE 结果，与 document.evaluate 的用法一致。
+XPATH_CACHE_BOOTSTRAP_JS = """
+() => {
+    if (window.__xpEval) return;
+    const cache = new Map();
+    window.__xpEval = (selector, context) => {
+        let expr = cache.get(selector);
+        if (!expr) {
+            expr = document.createExpression(selector, null);
+            cache.set(selector, expr);
+        }
+        return expr.evaluate(context || document, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    };
+}
+"""
+
+def xpath_literal(value: str) -> str:
+    """将任意字符串转换为合法的XPath字符串字面量（同时含单双引号时使用concat()拼接）"""
+    if "'" not in value:
+        return f"'{value}'"
+    if '"' not in value:
+        return f'"{value}"'
+    parts = value.split("'")
+    return "concat(" + ", \"'\", ".join(f"'{part}'" for part in parts) + ")"
+
 class BrowserManager:
     """基于Playwright的精简版浏览器管理器"""
 
@@ -13,6 +40,9 @@ class BrowserManager:
         self.browser: Optional[Browser] = None
         self.page: Optional[Page] = None
         self.profile_dir = os.path.join(os.getcwd(), "playwright_chrome_profile")
+        # 当前页面的CDP会话（按需创建，页面变化时重建）
+        self._cdp_session = None
+        self._cdp_page = None
         
         # 设置日志
         self.logger = logging.getLogger('BrowserManager')
@@ -74,6 +104,11 @@ class BrowserManager:
             self.browser = context
             if context.pages:
                 self.page = context.pages[0]
+                # 持久化配置可能恢复上次会话遗留的多个标签页，一次性并发关闭多余的标签页
+                leftover_pages = context.pages[1:]
+                if leftover_pages:
+                    closed = await self.close_pages(leftover_pages)
+                    self.logger.info(f"已关闭 {closed} 个遗留的标签页")
             else:
                 self.page = await context.new_page()
             
@@ -83,6 +118,19 @@ class BrowserManager:
             self.logger.error(f"启动Playwright浏览器失败: {e}", exc_info=True)
             return False
 
+    async def close_pages(self, pages: List[Page]) -> int:
+        """
+        并发关闭多个页面（标签页），所有关闭请求同时发出，只需等待一轮往返。
+
+        Returns:
+            int: 成功关闭的页面数
+        """
+        results = await asyncio.gather(*(page.close() for page in pages), return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                self.logger.warning(f"关闭标签页时出现警告（可忽略）: {result}")
+        return sum(1 for result in results if not isinstance(result, Exception))
+
     def is_connected(self) -> bool:
         """检查浏览器是否仍然连接"""
         return self.browser is not None and not self.browser.is_closed()
@@ -101,15 +149,39 @@ class BrowserManager:
             self.logger.error(f"导航到 {url} 失败: {e}")
             return False
 
+    async def install_xpath_cache(self) -> bool:
+        """
+        在当前页面安装XPath表达式缓存（window.__xpEval）。
+        页面导航后window会被重置，因此每次导航后都需要重新调用。
+        """
+        if not self.page: return False
+        try:
+            await self.page.evaluate(XPATH_CACHE_BOOTSTRAP_JS)
+            return True
+        except Exception as e:
+            self.logger.warning(f"安装XPath缓存脚本失败: {e}")
+            return False
+
+    def _locator(self, selector: str) -> Locator:
+        """根据选择器类型（CSS或XPath）构造Locator；以 '/' 或 '(/' 开头的视为XPath"""
+        if selector.startswith('/') or selector.startswith('(/'):
+            return self.page.locator(f"xpath={selector}")
+        return self.page.locator(selector)
+
+    def get_locator(self, selector: Optional[str], last: bool = False) -> Optional[Locator]:
+        """
+        构造可复用的Locator（默认指向第一个匹配元素，last=True时指向最后一个）。
+        Locator是惰性的，每次使用时才会在当前页面中解析，页面导航后依然有效。
+        """
+        if not self.page or not selector: return None
+        locator = self._locator(selector)
+        return locator.last if last else locator.first
+
     async def find_element(self, selector: str, timeout: int = 10) -> Optional[Locator]:
         """查找单个元素，支持CSS和XPath选择器，返回第一个匹配的Locator"""
         if not self.page: return None
         try:
-            # 判断是否为XPath选择器
-            if selector.startswith('//') or selector.startswith('/'):
-                locator = self.page.locator(f"xpath={selector}").first
-            else:
-                locator = self.page.locator(selector).first
+            locator = self._locator(selector).first
             await locator.wait_for(state='attached', timeout=timeout * 1000)
             return locator
         except Exception:
@@ -120,11 +192,7 @@ class BrowserManager:
         """查找所有匹配的元素，支持CSS和XPath选择器，返回Locator列表"""
         if not self.page: return []
         try:
-            # 判断是否为XPath选择器
-            if selector.startswith('//') or selector.startswith('/'):
-                locator = self.page.locator(f"xpath={selector}")
-            else:
-                locator = self.page.locator(selector)
+            locator = self._locator(selector)
             
             # 等待第一个元素出现，然后返回所有匹配的元素
             await locator.first.wait_for(state='attached', timeout=timeout * 1000)
@@ -133,6 +201,108 @@ class BrowserManager:
             self.logger.debug(f"查找多个元素超时或失败: {selector}")
             return []
 
+    async def wait_for_state(self, selector: str, state: str = 'visible', timeout: int = 10) -> bool:
+        """
+        等待元素进入指定状态（'attached'/'detached'/'visible'/'hidden'）。
+        由Playwright在浏览器端监听DOM变化，状态一变化立即返回，无需轮询。
+        
+        Returns:
+            bool: 在超时时间内达到该状态返回True，否则返回False
+        """
+        if not self.page: return False
+        try:
+            await self._locator(selector).first.wait_for(state=state, timeout=timeout * 1000)
+            return True
+        except Exception:
+            self.logger.debug(f"等待元素状态 '{state}' 超时: {selector}")
+            return False
+
+    async def wait_for_function(self, script: str, arg: Any = None, timeout: float = 10, polling: int = 100) -> bool:
+        """
+        在浏览器端轮询执行JS函数，直到其返回真值。
+        轮询发生在页面内部，不产生额外的CDP往返。
+        
+        Returns:
+            bool: 在超时时间内条件成立返回True，否则返回False
+        """
+        if not self.page: return False
+        try:
+            await self.page.wait_for_function(script, arg=arg, timeout=timeout * 1000, polling=polling)
+            return True
+        except Exception:
+            self.logger.debug("等待页面条件成立超时。")
+            return False
+
+    async def wait_for_predicate(self, predicate_js: str, arg: Any = None, timeout: float = 10,
+                                 initial: float = 0.25, cap: float = 4.0) -> bool:
+        """
+        以自适应间隔轮询页面中的JS谓词，直到其返回真值或超时。
+        初始间隔很短，条件未满足时间隔逐次翻倍（不超过cap秒）：
+        快速完成的操作几乎没有额外等待，慢操作也不会被频繁查询。
+        
+        Returns:
+            bool: 在超时时间内条件成立返回True，否则返回False
+        """
+        if not self.page: return False
+
+        async def check():
+            try:
+                return await self.page.evaluate(predicate_js, arg)
+            except Exception as e:
+                self.logger.debug(f"执行等待条件脚本失败: {e}")
+                return False
+
+        return await self._poll(check, timeout, initial, cap)
+
+    async def _poll(self, check, timeout: float, initial: float, cap: float) -> bool:
+        """以指数退避的间隔反复执行异步检查函数，直到其返回真值或超时"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        interval = initial
+        while True:
+            if await check():
+                return True
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return False
+            await asyncio.sleep(min(interval, remaining))
+            interval = min(interval * 2, cap)
+
+    async def _get_cdp_session(self):
+        """获取（必要时创建）当前页面的CDP会话"""
+        if self._cdp_session is None or self._cdp_page is not self.page:
+            self._cdp_session = await self.browser.new_cdp_session(self.page)
+            self._cdp_page = self.page
+        return self._cdp_session
+
+    async def cdp_evaluate(self, expression: str) -> Any:
+        """
+        通过CDP的 Runtime.evaluate 直接在页面中求值并按值返回结果。
+        绕过Playwright的Locator解析与可操作性检查，适合高频轮询的简单判断。
+        表达式抛出异常或CDP调用失败时抛出异常。
+        """
+        if not self.page:
+            raise RuntimeError("页面未初始化")
+        session = await self._get_cdp_session()
+        response = await session.send('Runtime.evaluate', {
+            'expression': expression,
+            'returnByValue': True,
+        })
+        if 'exceptionDetails' in response:
+            raise RuntimeError(f"CDP脚本执行出错: {response['exceptionDetails'].get('text')}")
+        return response.get('result', {}).get('value')
+
+    async def cdp_wait_for(self, expression: str, timeout: float = 10,
+                           initial: float = 0.25, cap: float = 4.0) -> bool:
+        """
+        以自适应间隔通过CDP轮询表达式，直到其结果为真值或超时。
+        CDP调用本身失败（如会话不可用）时抛出异常，便于调用方回退到Playwright方式。
+        """
+        async def check():
+            return await self.cdp_evaluate(expression)
+
+        return await self._poll(check, timeout, initial, cap)
+
     async def execute_script(self, script: str, arg: Any = None) -> Any:
         """在页面上执行JavaScript"""
         if not self.page: return None
@@ -142,23 +312,6 @@ class BrowserManager:
             self.logger.error(f"执行脚本失败: {e}")
             return None
 
-    async def focus_and_type_text(self, selector: str, text: str, clear_first: bool = True, timeout: int = 10) -> bool:
-        """聚焦到元素并输入文本"""
-        element = await self.find_element(selector, timeout)
-        if not element:
-            self.logger.error(f"无法找到元素以输入文本: {selector}")
-            return False
-        try:
-            await element.focus()
-            if clear_first:
-                await element.fill(text)
-            else:
-                await element.press_sequentially(text) # 使用更自然的输入方式
-            return True
-        except Exception as e:
-            self.logger.error(f"输入文本到 '{selector}' 失败: {e}")
-            return False
-
     async def upload_file_with_dialog(self, trigger_selector: str, file_path: str, timeout: int = 10) -> bool:
         """
         通过点击按钮触发文件选择对话框来上传文件。
@@ -196,6 +349,14 @@ class BrowserManager:
 
     async def cleanup(self):
         """关闭浏览器和Playwright实例"""
+        if self._cdp_session is not None:
+            try:
+                await self._cdp_session.detach()
+            except Exception:
+                pass
+            self._cdp_session = None
+            self._cdp_page = None
+
         try:
             if self.browser:
                 self.logger.info("正在关闭浏览器...")
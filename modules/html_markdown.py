@@ -0,0 +1,64 @@
+# modules/html_markdown.py
+"""
+HTML → Markdown 转换
+供 MonicaAutomator 和 PoeAutomator 共用
+"""
+
+import re
+from html import unescape
+from typing import Optional
+
+from bs4 import BeautifulSoup
+from markdownify import MarkdownConverter, ATX
+
+# lxml 为C实现的解析器，比标准库 html.parser 快得多；未安装时回退
+try:
+    import lxml  # noqa: F401
+    _PARSER = 'lxml'
+except ImportError:
+    _PARSER = 'html.parser'
+
+# 转换器只创建一次，各次转换复用同一套配置
+_CONVERTER = MarkdownConverter(heading_style=ATX)
+
+# 连续三个及以上换行（中间可夹空白）压缩为一个空行
+_RE_TRIPLE_BLANK = re.compile(r'\n\s*\n\s*\n')
+
+# 快速路径：标签数不超过该值且只含<p>/<br>时，不构建解析树
+_SIMPLE_TAG_LIMIT = 4
+_RE_SIMPLE_BR = re.compile(r'<br\s*/?>')
+_RE_WHITESPACE = re.compile(r'\s+')
+
+
+def _simple_to_markdown(html: str) -> Optional[str]:
+    """
+    只含<p>和<br>的简单HTML直接用字符串操作转换，输出与markdownify默认行为保持一致
+    （段落间空一行，<br>为行尾两个空格加换行，转义 * 和 _）。含其他标签时返回None。
+    """
+    paragraphs = []
+    for block in html.replace('</p>', '<p>').split('<p>'):
+        lines = []
+        for segment in _RE_SIMPLE_BR.split(block):
+            if '<' in segment:
+                return None
+            text = _RE_WHITESPACE.sub(' ', unescape(segment)).strip()
+            lines.append(text.replace('*', '\\*').replace('_', '\\_'))
+        block_text = '  \n'.join(lines).strip()
+        if block_text:
+            paragraphs.append(block_text)
+    return '\n\n'.join(paragraphs)
+
+
+def html_to_markdown(html: str) -> str:
+    """
+    将HTML转换为Markdown并清理多余空行。
+    这是同步的CPU密集操作，在异步代码中应通过 asyncio.to_thread 调用。
+    """
+    if html.count('<') <= _SIMPLE_TAG_LIMIT:
+        simple = _simple_to_markdown(html)
+        if simple is not None:
+            return simple
+    soup = BeautifulSoup(html, _PARSER)
+    content = _CONVERTER.convert_soup(soup)
+    content = _RE_TRIPLE_BLANK.sub('\n\n', content)
+    return content.strip()
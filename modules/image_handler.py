@@ -1,16 +1,47 @@
 # 支持模型配置文件动态加载
 import os
+import io
 import time
 import requests
+import urllib3
 import random
 import string
 import uuid
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict, deque
+from urllib.parse import urlparse
+from urllib3.exceptions import InsecureRequestWarning
 from PIL import Image
-from qiniu import Auth, put_file, BucketManager
+from qiniu import Auth, put_file, put_data, BucketManager
 import logging
 
+# 允许处理的最大源图像素数，超过则视为异常图片（防止解压炸弹占用大量内存）
+MAX_SOURCE_PIXELS = 8192 * 8192
+
+# 直接复制JPEG原始字节时允许保留的段：APP0(JFIF)、APP14(Adobe颜色变换)，以及以此开头的APP2(ICC色彩配置)
+_SAFE_JPEG_SEGMENTS = frozenset({'APP0', 'APP14'})
+_ICC_PROFILE_PREFIX = b'ICC_PROFILE\0'
+
+
+def _has_jpeg_metadata(img):
+    """JPEG中含有EXIF、XMP、IPTC、注释等元数据段时返回True（无法判断时也视为含有）"""
+    applist = getattr(img, 'applist', None)
+    if applist is None:
+        return True
+    for marker, data in applist:
+        if marker in _SAFE_JPEG_SEGMENTS:
+            continue
+        if marker == 'APP2' and data.startswith(_ICC_PROFILE_PREFIX):
+            continue
+        return True
+    return 'exif' in img.info or 'comment' in img.info
+
+
 class ImageHandler:
-    def __init__(self, access_key=None, secret_key=None, bucket_name=None, domain=None):
+    def __init__(self, access_key=None, secret_key=None, bucket_name=None, domain=None, cache_size=256, token_ttl=3600,
+                 trusted_hosts=None):
         """
         初始化图片处理器
         
@@ -19,14 +50,40 @@ class ImageHandler:
             secret_key: 七牛云Secret Key  
             bucket_name: 七牛云存储空间名称
             domain: 七牛云域名
+            cache_size: 已处理图片缓存的最大条目数
+            token_ttl: 上传凭证有效期（秒），有效期内的批量上传复用同一个凭证
+            trusted_hosts: 下载时跳过TLS证书校验的主机名集合（仅用于证书有问题的图床）
         """
         self.access_key = access_key
         self.secret_key = secret_key
         self.bucket_name = bucket_name
         self.domain = domain
         
-        # 设置日志
-        logging.basicConfig(level=logging.INFO)
+        # 复用HTTP连接，避免每张图片重复建立TCP/TLS连接
+        self.session = requests.Session()
+        
+        # 默认校验TLS证书（使用requests自带的certifi证书包），仅对显式信任的主机跳过校验
+        self.trusted_hosts = frozenset(trusted_hosts or ())
+        if self.trusted_hosts:
+            urllib3.disable_warnings(InsecureRequestWarning)
+        
+        # 已处理图片缓存：(原始URL, 底部裁剪像素) -> 七牛云URL，按LRU淘汰
+        self._url_cache = OrderedDict()
+        self._cache_size = cache_size
+        # 保护图片缓存和上传凭证缓存，允许多个线程并发调用 process_and_upload_image
+        self._cache_lock = threading.Lock()
+        
+        # 临时文件目录在首次使用时创建一次，下载用的临时路径放入池中循环复用
+        self._temp_dir = None
+        self._temp_path_pool = deque()
+        self._temp_lock = threading.Lock()
+        
+        # 上传凭证缓存：有效期内复用，避免每张图片都重新签名
+        self.token_ttl = token_ttl or 3600
+        self._cached_token = None
+        self._token_expires_at = 0
+        
+        # 设置日志（全局日志配置由程序入口 main.py 负责）
         self.logger = logging.getLogger(__name__)
         
         # 初始化七牛云认证
@@ -49,17 +106,8 @@ class ImageHandler:
             bool: 下载是否成功
         """
         try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-            }
-            if referer:
-                headers['Referer'] = referer
-            
-            response = requests.get(url, headers=headers, timeout=15, verify=False)
-            response.raise_for_status()
-            
             with open(save_path, 'wb') as f:
-                f.write(response.content)
+                self._stream_download(url, f, referer=referer)
             self.logger.info(f"图片下载成功: {save_path}")
             return True
             
@@ -67,47 +115,156 @@ class ImageHandler:
             self.logger.error(f"图片下载失败 {url}: {str(e)}")
             return False
 
-    def crop_and_resize_image(self, image_path, output_path, max_width=800, max_height=600, crop_bottom_pixels=0):
+    def download_image_data(self, url, referer=None):
+        """
+        下载图片到内存缓冲区，不落地到磁盘。
+        
+        Args:
+            url: 图片URL
+            referer: 下载时使用的Referer头
+            
+        Returns:
+            io.BytesIO: 图片数据，失败返回None
+        """
+        try:
+            buffer = io.BytesIO()
+            self._stream_download(url, buffer, referer=referer)
+            buffer.seek(0)
+            self.logger.info(f"图片下载成功: {url} ({buffer.getbuffer().nbytes} 字节)")
+            return buffer
+            
+        except Exception as e:
+            self.logger.error(f"图片下载失败 {url}: {str(e)}")
+            return None
+
+    def _stream_download(self, url, fileobj, referer=None):
+        """流式下载：先检查状态码，再按64KB分块写入目标文件对象"""
+        headers = {
+            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+        }
+        if referer:
+            headers['Referer'] = referer
+        
+        verify = urlparse(url).hostname not in self.trusted_hosts
+        with self.session.get(url, headers=headers, timeout=15, verify=verify, stream=True) as response:
+            response.raise_for_status()
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                fileobj.write(chunk)
+
+    def crop_and_resize_image(self, image_path, output_path, max_width=800, max_height=600, crop_bottom_pixels=0,
+                              final_quality=False):
         """
         裁剪和调整图片大小
         
         Args:
-            image_path: 输入图片路径
-            output_path: 输出图片路径
+            image_path: 输入图片路径或文件对象（如BytesIO）
+            output_path: 输出图片路径或文件对象（如BytesIO）
             max_width: 最大宽度
             max_height: 最大高度
             crop_bottom_pixels: 从底部裁剪的像素值
+            final_quality: 为True时额外执行Huffman优化（体积略小，编码约慢一倍）
         """
         try:
+            # 先做轻量校验：只读文件头判断尺寸，并用verify()检查数据完整性，不做完整解码
+            if not self._verify_image(image_path):
+                return False
+            
             with Image.open(image_path) as img:
+                width, height = img.size
+                needs_crop = crop_bottom_pixels > 0 and height > crop_bottom_pixels
+                needs_resize = width > max_width or height > max_height
+                needs_convert = img.mode != 'RGB'
+                
+                # 已是尺寸合规的RGB JPEG、无需裁剪且不含EXIF等元数据时，直接复制原始字节，省去一次解码+编码。
+                # 含元数据的图片仍重新编码，与原流程一样去掉GPS、相机信息和方向标记后再上传到公开CDN
+                if (img.format == 'JPEG' and not (needs_crop or needs_resize or needs_convert)
+                        and not _has_jpeg_metadata(img)):
+                    self._copy_image_bytes(image_path, output_path)
+                    self.logger.info(f"图片无需处理，已直接复制: {self._describe_target(output_path)}")
+                    return True
+                
+                # 需要大幅缩小的JPEG让libjpeg在解码时直接按1/2、1/4、1/8缩放，
+                # 保留2倍余量给后续的LANCZOS缩放，保证画质
+                if img.format == 'JPEG' and needs_resize:
+                    img.draft('RGB', (max_width * 2, max_height * 2))
+                    if img.size != (width, height):
+                        # 解码尺寸已变化，底部裁剪像素按同样比例换算
+                        crop_bottom_pixels = round(crop_bottom_pixels * img.height / height)
+                        width, height = img.size
+                        needs_crop = crop_bottom_pixels > 0 and height > crop_bottom_pixels
+                
                 # 转换为RGB模式（如果是RGBA或其他模式）
                 if img.mode != 'RGB':
                     img = img.convert('RGB')
                 
                 # 1. 先从底部裁剪
-                if crop_bottom_pixels > 0 and img.height > crop_bottom_pixels:
-                    width, height = img.size
+                if needs_crop:
                     img = img.crop((0, 0, width, height - crop_bottom_pixels))
                     self.logger.info(f"已从图片底部裁剪 {crop_bottom_pixels} 像素")
 
-                # 2. 再计算缩放比例
-                width, height = img.size
-                ratio = min(max_width / width, max_height / height)
+                # 2. 再按比例原地缩放（图片已在范围内时thumbnail不做任何处理）
+                img.thumbnail((max_width, max_height), Image.Resampling.LANCZOS)
                 
-                if ratio < 1:
-                    new_width = int(width * ratio)
-                    new_height = int(height * ratio)
-                    img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+                # 保存处理后的图片：缩略图直接上传CDN，默认不做Huffman优化，使用基线编码和4:2:0色度抽样
+                img.save(output_path, 'JPEG', quality=85, optimize=final_quality,
+                         progressive=False, subsampling=2)
                 
-                # 保存处理后的图片
-                img.save(output_path, 'JPEG', quality=85, optimize=True)
-                
-            self.logger.info(f"图片处理成功: {output_path}")
+            self.logger.info(f"图片处理成功: {self._describe_target(output_path)}")
             return True
             
         except Exception as e:
-            self.logger.error(f"图片处理失败 {image_path}: {str(e)}")
+            self.logger.error(f"图片处理失败 {self._describe_target(image_path)}: {str(e)}")
+            return False
+
+    def _verify_image(self, image_path):
+        """
+        用独立的句柄校验图片：像素数超限或数据损坏时返回False。
+        verify()之后句柄不可再用于解码，因此处理时需重新打开。
+        """
+        try:
+            with Image.open(image_path) as probe:
+                width, height = probe.size
+                if width * height > MAX_SOURCE_PIXELS:
+                    self.logger.warning(f"图片尺寸过大 ({width}x{height})，已跳过: {self._describe_target(image_path)}")
+                    return False
+                probe.verify()
+            return True
+        except Exception as e:
+            self.logger.warning(f"图片校验失败，可能已损坏 {self._describe_target(image_path)}: {str(e)}")
             return False
+        finally:
+            # 文件对象需要回到开头，供后续重新打开
+            if not isinstance(image_path, str):
+                image_path.seek(0)
+
+    def _remove_broken_file(self, image_path):
+        """删除本类自己创建的临时文件（调用方传入的文件一律不删除）"""
+        if isinstance(image_path, str):
+            try:
+                os.remove(image_path)
+            except OSError:
+                pass
+
+    def _copy_image_bytes(self, source, target):
+        """将原始图片字节复制到目标，source/target 均可为路径或文件对象"""
+        if isinstance(source, str) and isinstance(target, str):
+            shutil.copyfile(source, target)
+            return
+        
+        src = open(source, 'rb') if isinstance(source, str) else source
+        dst = open(target, 'wb') if isinstance(target, str) else target
+        try:
+            src.seek(0)
+            shutil.copyfileobj(src, dst)
+        finally:
+            if src is not source:
+                src.close()
+            if dst is not target:
+                dst.close()
+
+    def _describe_target(self, target):
+        """返回用于日志的路径描述，内存缓冲区不打印对象地址"""
+        return target if isinstance(target, str) else "内存缓冲区"
 
     def generate_random_filename(self, extension="jpg"):
         """
@@ -132,6 +289,23 @@ class ImageHandler:
         Returns:
             str: 上传成功返回图片URL，失败返回None
         """
+        return self._upload(put_file, local_path, key)
+
+    def upload_data_to_qiniu(self, data, key=None):
+        """
+        直接上传内存中的图片数据到七牛云，无需临时文件
+        
+        Args:
+            data: 图片二进制数据
+            key: 七牛云存储的文件名，如果为None则自动生成
+            
+        Returns:
+            str: 上传成功返回图片URL，失败返回None
+        """
+        return self._upload(put_data, data, key)
+
+    def _upload(self, put_func, payload, key=None):
+        """使用 put_file / put_data 执行上传并构造图片URL"""
         if not self.auth:
             self.logger.error("七牛云认证未配置")
             return None
@@ -141,15 +315,15 @@ class ImageHandler:
             return None
             
         try:
-            # 生成上传凭证
-            token = self.auth.upload_token(self.bucket_name)
+            # 获取上传凭证（有效期内复用缓存）
+            token = self._get_upload_token()
             
             # 如果没有指定key，则自动生成
             if not key:
                 key = self.generate_random_filename()
             
             # 上传文件
-            ret, info = put_file(token, key, local_path)
+            ret, info = put_func(token, key, payload)
             
             if info.status_code == 200:
                 # 构造图片URL
@@ -168,6 +342,15 @@ class ImageHandler:
             self.logger.error(f"图片上传异常: {str(e)}")
             return None
 
+    def _get_upload_token(self):
+        """返回缓存的上传凭证，剩余有效期不足60秒时重新生成"""
+        with self._cache_lock:
+            now = time.time()
+            if self._cached_token is None or self._token_expires_at - now < 60:
+                self._cached_token = self.auth.upload_token(self.bucket_name, expires=self.token_ttl)
+                self._token_expires_at = now + self.token_ttl
+            return self._cached_token
+
     def download_and_crop(self, url, crop_bottom_pixels=0, referer=None):
         """
         下载图片并裁剪，返回本地路径
@@ -178,38 +361,61 @@ class ImageHandler:
             referer: 下载时使用的Referer头
             
         Returns:
-            str: 处理后的本地图片路径，失败返回None
+            str: 处理后的本地图片路径（位于系统临时目录，由调用方负责删除），失败返回None
         """
+        original_path = None
+        processed_path = None
         try:
-            # 生成临时文件路径
-            temp_dir = "/tmp"
-            if not os.path.exists(temp_dir):
-                os.makedirs(temp_dir)
-                
-            original_filename = self.generate_random_filename()
-            processed_filename = f"processed_{original_filename}"
-            
-            original_path = os.path.join(temp_dir, original_filename)
-            processed_path = os.path.join(temp_dir, processed_filename)
+            original_path = self._acquire_temp_path()
+            # 返回给调用方的文件不能放在实例的自动清理目录中，否则实例销毁后文件会随之消失
+            fd, processed_path = tempfile.mkstemp(prefix="processed_", suffix=".jpg")
+            os.close(fd)
             
             # 下载图片，传入referer
             if self.download_image(url, original_path, referer=referer):
                 # 处理图片
                 if self.crop_and_resize_image(original_path, processed_path, crop_bottom_pixels=crop_bottom_pixels):
-                    # 删除原始文件
-                    if os.path.exists(original_path):
-                        os.remove(original_path)
-                    return processed_path
+                    result, processed_path = processed_path, None
+                    return result
+                # 处理失败的下载文件是本类自己创建的，删除它，避免损坏文件留在临时目录中
+                self._remove_broken_file(original_path)
                     
             return None
             
         except Exception as e:
             self.logger.error(f"图片下载和处理失败: {str(e)}")
             return None
+        finally:
+            # 处理失败时删除已创建的输出文件
+            if processed_path:
+                self._remove_broken_file(processed_path)
+            # 原始下载文件的路径归还到池中，下次下载直接覆盖写入
+            if original_path:
+                self._release_temp_path(original_path)
+
+    def _get_temp_dir(self):
+        """获取本实例专用的临时目录（首次调用时创建，实例销毁时自动清理），只存放中间下载文件"""
+        with self._temp_lock:
+            if self._temp_dir is None:
+                self._temp_dir = tempfile.TemporaryDirectory(prefix="write_tool_images_")
+            return self._temp_dir.name
+
+    def _acquire_temp_path(self):
+        """从池中取出一个可复用的临时文件路径，池为空时新建"""
+        temp_dir = self._get_temp_dir()
+        with self._temp_lock:
+            if self._temp_path_pool:
+                return self._temp_path_pool.popleft()
+        return os.path.join(temp_dir, self.generate_random_filename())
+
+    def _release_temp_path(self, path):
+        """归还临时文件路径，供后续下载复用"""
+        with self._temp_lock:
+            self._temp_path_pool.append(path)
 
     def process_and_upload_image(self, url, crop_bottom_pixels=0, referer=None):
         """
-        完整的图片处理流程：下载 -> 处理 -> 上传 -> 清理
+        完整的图片处理流程：下载 -> 处理 -> 上传，全程在内存中完成，不产生临时文件
         
         Args:
             url: 原始图片URL
@@ -219,28 +425,43 @@ class ImageHandler:
         Returns:
             str: 七牛云图片URL，失败返回None
         """
-        local_path = None
+        cache_key = (url, crop_bottom_pixels)
+        with self._cache_lock:
+            cached_url = self._url_cache.get(cache_key)
+            if cached_url:
+                self._url_cache.move_to_end(cache_key)
+        if cached_url:
+            self.logger.info(f"图片已处理过，直接使用缓存链接: {cached_url}")
+            return cached_url
+        
         try:
-            # 下载并处理图片
-            local_path = self.download_and_crop(url, crop_bottom_pixels=crop_bottom_pixels, referer=referer)
-            if not local_path:
+            # 下载到内存
+            original = self.download_image_data(url, referer=referer)
+            if not original:
+                return None
+            
+            # 在内存中处理图片
+            processed = io.BytesIO()
+            if not self.crop_and_resize_image(original, processed, crop_bottom_pixels=crop_bottom_pixels):
                 return None
                 
             # 上传到七牛云
-            qiniu_url = self.upload_to_qiniu(local_path)
-            
+            qiniu_url = self.upload_data_to_qiniu(processed.getvalue())
+            if qiniu_url:
+                self._remember(cache_key, qiniu_url)
             return qiniu_url
             
         except Exception as e:
             self.logger.error(f"图片处理流程失败: {str(e)}")
             return None
-        finally:
-            # 清理临时文件
-            if local_path and os.path.exists(local_path):
-                try:
-                    os.remove(local_path)
-                except:
-                    pass
+
+    def _remember(self, cache_key, qiniu_url):
+        """写入已处理图片缓存，超出容量时淘汰最久未使用的条目"""
+        with self._cache_lock:
+            self._url_cache[cache_key] = qiniu_url
+            self._url_cache.move_to_end(cache_key)
+            while len(self._url_cache) > self._cache_size:
+                self._url_cache.popitem(last=False)
 
     def batch_process_images(self, image_urls, crop_bottom_pixels=0):
         """
@@ -271,6 +492,10 @@ class ImageHandler:
         self.bucket_name = bucket_name
         self.domain = domain
         
+        # 认证信息或存储空间已变化，之前的上传凭证作废
+        self._cached_token = None
+        self._token_expires_at = 0
+        
         if access_key and secret_key:
             self.auth = Auth(access_key, secret_key)
             self.logger.info("七牛云配置更新成功")
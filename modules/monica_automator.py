@@ -1,27 +1,116 @@
 import os
-import time
-import json
 import logging
-from typing import Optional, Any
+from typing import Optional, Union, Literal
 import copy
 import asyncio
-from playwright.async_api import async_playwright, Playwright
+import re
+from collections import deque
+
+from .browser_manager import BrowserManager, xpath_literal
+from .html_markdown import html_to_markdown
+from .automator_utils import count_chars, file_exists_cached, forget_file, load_config_cached
 
-from .browser_manager import BrowserManager
 
 def deep_merge(source: dict, destination: dict) -> dict:
     """
-    深度合并两个字典。
+    深度合并两个字典：将 source 合并进 destination（原地修改并返回 destination）。
+    使用显式队列代替递归；仅在目标中缺少对应子字典时才新建字典。
     """
-    for key, value in source.items():
-        if isinstance(value, dict):
-            # 获取节点，如果不存在则创建
-            node = destination.setdefault(key, {})
-            deep_merge(value, node)
-        else:
-            destination[key] = value
+    pending = deque([(source, destination)])
+    while pending:
+        src, dst = pending.popleft()
+        for key, value in src.items():
+            if isinstance(value, dict):
+                if key in dst and isinstance(dst[key], dict):
+                    node = dst[key]
+                else:
+                    node = dst[key] = {}
+                pending.append((value, node))
+            else:
+                dst[key] = value
     return destination
 
+# 在聊天区域安装MutationObserver，记录DOM变化次数和最后一次变化的时间，
+# 用于在浏览器端判断响应内容是否已停止变化
+RESPONSE_TRACKER_JS = """
+() => {
+    if (window.__respTracker) return;
+    const tracker = {count: 0, last: performance.now()};
+    window.__respTracker = tracker;
+    const root = document.getElementById('monica-chat-scroll-box') || document.body;
+    new MutationObserver((mutations) => {
+        tracker.count += mutations.length;
+        tracker.last = performance.now();
+    }).observe(root, {childList: true, subtree: true, characterData: true});
+}
+"""
+
+# 记录响应容器的快照：匹配到的响应数量和最后一条响应的文本，发送提示前调用，
+# 用于之后确认新回复确实已开始输出（而不只是用户自己的消息出现在聊天区域中）
+RESPONSE_SNAPSHOT_JS = """
+(xpath) => {
+    const all = window.__xpEval
+        ? window.__xpEval(xpath)
+        : document.evaluate(xpath, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    const n = all.snapshotLength;
+    const last = n > 0 ? all.snapshotItem(n - 1) : null;
+    return {n: n, text: last ? (last.textContent || '') : ''};
+}
+"""
+
+# 距最后一次DOM变化已超过 quietMs 毫秒时返回true；
+# 传入 since 时还要求变化次数已超过该基准值，传入 snapshot 时还要求响应容器已与发送前的快照不同
+RESPONSE_QUIET_JS = """
+({quietMs, since, xpath, snapshot}) => {
+    const tracker = window.__respTracker;
+    if (!tracker) return since === null;
+    if (since !== null && tracker.count <= since) return false;
+    if (snapshot) {
+        const current = (""" + RESPONSE_SNAPSHOT_JS.strip() + """)(xpath);
+        if (!current.text.trim()) return false;
+        if (current.n === snapshot.n && current.text === snapshot.text) return false;
+    }
+    return performance.now() - tracker.last >= quietMs;
+}
+"""
+
+# 读取当前已记录的DOM变化次数，作为判断响应是否开始输出的基准
+RESPONSE_MUTATION_COUNT_JS = "() => window.__respTracker ? window.__respTracker.count : null"
+
+# 识别真正的HTML标签（而不是正文或代码片段中出现的普通 '<'、'>' 字符）
+_HTML_TAG = re.compile(r'<(?:(?:p|div|h[1-6]|ul|ol|li|strong|em|br)\b|a\s|/\w)', re.I)
+
+# 获取最后一个响应元素的内容。脚本为固定字符串，选择器和模式通过 page.evaluate 的参数传入，
+# 无需拼接和转义，浏览器也可以复用该脚本的编译结果
+GET_RESPONSE_JS = """
+({xpath, mode}) => {
+    try {
+        // 优先使用页面中缓存的已编译XPath表达式，未安装时回退到document.evaluate
+        const allResponses = window.__xpEval
+            ? window.__xpEval(xpath)
+            : document.evaluate(xpath, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+        if (allResponses.snapshotLength > 0) {
+            const lastResponse = allResponses.snapshotItem(allResponses.snapshotLength - 1);
+            // 浏览器已完成排版，innerText可直接得到纯文本，无需在Python端再解析HTML
+            const text = lastResponse.innerText || lastResponse.textContent || '';
+            if (mode === 'text') {
+                return text;
+            }
+            if (mode === 'auto') {
+                return {html: lastResponse.innerHTML || '', text: text};
+            }
+            // 优先获取innerHTML以保留格式，如果失败则获取纯文本
+            return lastResponse.innerHTML || text;
+        }
+        return null;
+    } catch (error) {
+        console.error('获取响应时出错:', error);
+        return null;
+    }
+}
+"""
+
+
 class MonicaAutomator:
     """基于Chrome DevTools Protocol的Monica自动化器"""
 
@@ -33,9 +122,9 @@ class MonicaAutomator:
         # 1. 首先加载基础配置文件，这里面包含了 selectors
         config = self._load_config('monica_config.json')
         
-        # 2. 然后，用从GUI传来的配置去更新基础配置。
+        # 2. 然后，用从GUI传来的配置深度合并到基础配置中。
         #    这样可以覆盖 model_url 等顶层键，但不会破坏深层的 selectors 字典。
-        config.update(gui_config)
+        deep_merge(gui_config, config)
         self.config = config
         
         # 3. 在这里设置最终的 model_url
@@ -49,12 +138,24 @@ class MonicaAutomator:
         # 提取常用配置项
         self.timeouts = self.config.get('timeouts', {})
         
-        # 预加载选择器，这些方法现在会从 self.selectors 中正确读取
+        # 将 selectors['chat'] 预先展平为一层字典，后续查找只需一次哈希查询；
+        # selectors['chat_css'] 中有等价CSS选择器的键优先使用CSS（querySelector比XPath求值更快）
+        self._sel_cache = {**self.selectors.get('chat', {}), **self.selectors.get('chat_css', {})}
+        
+        # 预加载选择器，这些方法会从 self._sel_cache 中读取
         self.chat_input_selector = self._get_selector('chat_input')
         self.send_button_selector = self._get_selector('send_button')
         self.upload_button_selector = self._get_selector('upload_button')
+        self.file_input_selector = self._get_selector('file_input')
         self.stop_generating_button_selector = self._get_selector('stop_button')
         self.response_container_selector = self._get_selector('last_response')
+        self.file_chip_container_selector = self._get_selector('file_chip_container')
+
+        # 预先构建Locator，各调用点复用同一对象，无需每次重新构造
+        self.chat_input_loc = self.browser_manager.get_locator(self.chat_input_selector)
+        self.response_container_loc = self.browser_manager.get_locator(self.response_container_selector)
+        # 最近一次发送提示前的响应容器快照，由 send_prompt 记录
+        self._response_snapshot: Optional[dict] = None
 
         self.logger.info(f"Monica自动化器初始化完成，目标URL: {self.model_url}")
         self.logger.info(f"聊天输入框选择器: {self.chat_input_selector}")
@@ -62,52 +163,50 @@ class MonicaAutomator:
         self.logger.info(f"停止按钮选择器: {self.stop_generating_button_selector}")
         self.logger.info(f"响应容器选择器: {self.response_container_selector}")
 
-    def _setup_logging(self):
-        """设置日志记录器"""
-        logger = logging.getLogger('MonicaAutomator')
-        if not logger.handlers:
-            handler = logging.StreamHandler()
-            formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-            handler.setFormatter(formatter)
-            logger.addHandler(handler)
-            logger.setLevel(logging.INFO)
-        return logger
-
     def _load_config(self, config_path: str) -> dict:
         """从JSON文件加载配置"""
         try:
-            if os.path.exists(config_path):
-                with open(config_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+            # 一次stat同时完成存在性检查与修改时间获取
+            mtime = os.stat(config_path).st_mtime
+        except FileNotFoundError:
             self.logger.warning(f"配置文件 {config_path} 不存在，将使用默认或GUI传入的配置。")
+            return {}
+        except OSError as e:
+            self.logger.error(f"加载配置文件 {config_path} 时发生未知错误: {e}")
+            return {}
+        try:
+            # 返回深拷贝，调用方修改配置不会污染缓存
+            return copy.deepcopy(load_config_cached(config_path, mtime))
         except Exception as e:
             self.logger.error(f"加载配置文件 {config_path} 时发生未知错误: {e}")
         return {}
     
     def _get_selector(self, key: str) -> Optional[str]:
-        """从 self.selectors 安全地获取XPath"""
-        try:
-            # 修复：正确访问嵌套的配置结构
-            chat_selectors = self.selectors.get('chat', {})
-            return chat_selectors.get(key)
-        except Exception as e:
-            self.logger.error(f"获取选择器 '{key}' 时出错: {e}")
-            return None
+        """从预先展平的选择器缓存中获取选择器（CSS优先，否则为XPath）"""
+        return self._sel_cache.get(key)
 
     async def navigate_to_monica(self) -> bool:
         """导航到Monica页面并等待聊天输入框加载"""
         self.logger.info(f"导航到Monica页面: {self.model_url}")
         await self.browser_manager.navigate(self.model_url)
+        # 安装XPath表达式缓存，后续获取响应时复用已编译的表达式
+        await self.browser_manager.install_xpath_cache()
         
         if not self.chat_input_selector:
             self.logger.error("无法获取聊天输入框选择器，初始化失败。")
             return False
 
         self.logger.info("等待聊天输入框出现...")
-        element = await self.browser_manager.find_element(
-            self.chat_input_selector, timeout=self.timeouts.get('navigation', 30)
-        )
-        if element:
+        try:
+            await self.chat_input_loc.wait_for(
+                state='attached', timeout=self.timeouts.get('navigation', 30) * 1000
+            )
+            element_found = True
+        except Exception:
+            element_found = False
+        if element_found:
+            # 开始跟踪聊天区域的DOM变化，用于判断响应是否已生成完毕
+            await self.browser_manager.execute_script(RESPONSE_TRACKER_JS)
             self.logger.info("成功导航到Monica页面并找到聊天输入框。")
             return True
         else:
@@ -124,31 +223,42 @@ class MonicaAutomator:
 
         self.logger.info("正在输入提示...")
         
-        # 使用精简后的BrowserManager方法
-        input_success = await self.browser_manager.focus_and_type_text(
-            self.chat_input_selector, prompt, clear_first=True
-        )
-
-        if not input_success:
-            self.logger.error("输入提示文本失败。")
+        # 输入和回车复用同一个Locator，不再重复查找输入框
+        try:
+            await self.chat_input_loc.fill(prompt)
+        except Exception as e:
+            self.logger.error(f"输入提示文本失败: {e}")
             return False
 
         self.logger.info("提示输入成功，准备通过模拟回车键发送。")
         
-        # 直接在找到的元素上按回车
-        input_element = await self.browser_manager.find_element(self.chat_input_selector)
-        if not input_element:
-            self.logger.error("无法重新定位输入框以按回车。")
+        # 发送前记录响应容器的快照，等待生成时据此判断新回复是否已开始
+        self._response_snapshot = None
+        if self.response_container_selector:
+            self._response_snapshot = await self.browser_manager.execute_script(
+                RESPONSE_SNAPSHOT_JS, self.response_container_selector
+            )
+        
+        try:
+            await self.chat_input_loc.press('Enter')
+        except Exception as e:
+            self.logger.error(f"在输入框上按回车失败: {e}")
             return False
-
-        await input_element.press('Enter')
         self.logger.info("提示已成功发送。")
         return True
 
-    async def get_response(self) -> Optional[str]:
+    async def get_response(self, mode: Literal['html', 'text', 'auto'] = 'html') -> Union[str, dict, None]:
         """
-        获取并返回生成的响应文本。
+        获取并返回生成的响应。
+
+        Args:
+            mode: 'html' 返回innerHTML（保留格式）；'text' 返回浏览器计算好的innerText；
+                  'auto' 同时返回两者，格式为 {'html': ..., 'text': ...}
         """
+        if mode not in ('html', 'text', 'auto'):
+            self.logger.error(f"不支持的响应获取模式: {mode}")
+            return None
+
         if not self.response_container_selector:
             self.logger.error("响应容器选择器未初始化。")
             return None
@@ -157,86 +267,116 @@ class MonicaAutomator:
         
         try:
             # 直接等待元素出现
-            response_element = await self.browser_manager.find_element(
-                self.response_container_selector, 
-                timeout=self.timeouts.get('response', 60)
+            await self.response_container_loc.wait_for(
+                state='attached', timeout=self.timeouts.get('response', 60) * 1000
             )
-            if not response_element:
-                self.logger.error("等待响应容器超时。")
-                return None
         except Exception as e:
-            self.logger.error(f"等待响应容器时出错: {e}")
+            self.logger.error(f"等待响应容器超时或出错: {e}")
             return None
 
-        # 转义选择器中的引号，避免JavaScript语法错误
-        escaped_selector = self.response_container_selector.replace('"', '\\"').replace("'", "\\'")
-        
-        js_script = f"""
-        (function() {{
-            try {{
-                var xpath = "{escaped_selector}";
-                var allResponses = document.evaluate(xpath, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
-                if (allResponses.snapshotLength > 0) {{
-                    var lastResponse = allResponses.snapshotItem(allResponses.snapshotLength - 1);
-                    // 优先获取innerHTML以保留格式，如果失败则获取纯文本
-                    return lastResponse.innerHTML || lastResponse.innerText || lastResponse.textContent || '';
-                }}
-                return null;
-            }} catch (error) {{
-                console.error('获取响应时出错:', error);
-                return null;
-            }}
-        }})()
-        """
-        
-        response_text = await self.browser_manager.execute_script(js_script)
+        response_text = await self.browser_manager.execute_script(
+            GET_RESPONSE_JS, {'xpath': self.response_container_selector, 'mode': mode}
+        )
         
-        if response_text:
-            self.logger.info(f"成功提取响应内容，长度: {len(response_text)} 字符")
-            # 如果获取到的是HTML内容，记录一下
-            if '<' in response_text and '>' in response_text:
-                self.logger.info("获取到HTML格式的响应内容")
-            else:
-                self.logger.info("获取到纯文本格式的响应内容")
-            return response_text
-        else:
+        if not response_text:
             self.logger.error("未能提取响应文本。")
             return None
 
+        if mode == 'auto':
+            if not (response_text.get('html') or response_text.get('text')):
+                self.logger.error("未能提取响应文本。")
+                return None
+            self.logger.info(f"成功提取响应内容，HTML长度: {len(response_text['html'])} 字符，文本长度: {len(response_text['text'])} 字符")
+        else:
+            self.logger.info(f"成功提取响应内容（{mode}），长度: {len(response_text)} 字符")
+        return response_text
+
     async def wait_for_generation_to_complete(self) -> bool:
         """等待内容生成完成（通过检测停止按钮是否消失）。"""
         if not self.stop_generating_button_selector:
             self.logger.error("未找到停止按钮选择器，无法判断生成状态。")
             return False
 
-        timeout = self.timeouts.get('generation', 120) * 1000  # 转换为毫秒
-        self.logger.info(f"等待'停止生成'按钮出现 (最长 {timeout / 1000} 秒)...")
+        timeout = self.timeouts.get('generation', 120)
+        self.logger.info(f"等待'停止生成'按钮出现 (最长 {timeout} 秒)...")
+        
+        # "停止按钮出现" 与 "响应已输出且停止变化" 两个条件竞速：
+        # 生成很快时按钮可能一闪而过甚至不出现，此时无需空等满20秒。
+        # 只有响应容器已与发送前的快照不同，才认为是新回复停止了变化，
+        # 避免用户自己的消息出现在聊天区域后、回复尚未开始时就误判为生成结束
+        baseline = await self.browser_manager.execute_script(RESPONSE_MUTATION_COUNT_JS)
+        snapshot = self._response_snapshot
+        stop_task = asyncio.create_task(
+            self.browser_manager.wait_for_state(self.stop_generating_button_selector, 'visible', timeout=20)
+        )
+        pending = {stop_task}
+        stable_task = None
+        if baseline is not None and snapshot is not None:
+            stable_task = asyncio.create_task(self._wait_response_stable(
+                quiet=self.timeouts.get('response_quiet', 3), timeout=20, since_count=baseline,
+                snapshot=snapshot
+            ))
+            pending.add(stable_task)
         
-        stop_button = await self.browser_manager.find_element(self.stop_generating_button_selector, timeout=20)
+        stop_appeared = finished_quietly = False
+        while pending and not (stop_appeared or finished_quietly):
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            stop_appeared = stop_task in done and stop_task.result()
+            finished_quietly = stable_task in done and stable_task.result()
+        for task in pending:
+            task.cancel()
         
-        if not stop_button:
+        if finished_quietly and not stop_appeared:
+            self.logger.info("未等到'停止生成'按钮，但响应已输出且停止变化，认为生成已结束。")
+            return True
+        
+        if not stop_appeared:
             self.logger.warning("'停止生成'按钮在20秒内未出现，可能生成已瞬间完成或未开始。将直接认为生成已结束。")
+            await self._wait_response_stable()
             return True
 
         self.logger.info("'停止生成'按钮已出现，现在等待它消失...")
         
-        try:
-            await stop_button.wait_for(state='hidden', timeout=timeout)
+        if await self.browser_manager.wait_for_state(self.stop_generating_button_selector, 'hidden', timeout=timeout):
             self.logger.info("'停止生成'按钮已消失，内容生成完毕。")
+            # 按钮消失后响应区域可能还在做最后的渲染，等待DOM静止后再提取
+            await self._wait_response_stable()
             return True
-        except Exception:
-            self.logger.error(f"'停止生成'按钮在 {timeout / 1000} 秒后仍未消失。")
+        self.logger.error(f"'停止生成'按钮在 {timeout} 秒后仍未消失。")
+        return False
+
+    async def _wait_response_stable(self, quiet: float = 1.0, timeout: float = 10,
+                                    since_count: Optional[int] = None,
+                                    snapshot: Optional[dict] = None) -> bool:
+        """
+        等待聊天区域在 quiet 秒内没有任何DOM变化（由页面内的MutationObserver判断）。
+        传入 since_count 时，还要求DOM变化次数已超过该基准值；
+        传入 snapshot 时，还要求响应容器已与发送提示前的快照不同。
+        """
+        stable = await self.browser_manager.wait_for_function(
+            RESPONSE_QUIET_JS,
+            arg={'quietMs': quiet * 1000, 'since': since_count,
+                 'xpath': self.response_container_selector, 'snapshot': snapshot},
+            timeout=timeout
+        )
+        if not stable and since_count is None:
+            self.logger.warning(f"响应区域在 {timeout} 秒内仍在变化，继续提取当前内容。")
+        return stable
+
+    async def _wait_for_file_chip(self, file_name: str, timeout: float = 10) -> bool:
+        """
+        等待输入区中出现显示该文件名的附件标签，确认上传完成。
+        只在输入区容器内按文件名做XPath匹配，不扫描整个页面的文本。
+        """
+        if not self.file_chip_container_selector:
+            self.logger.warning("配置中缺少 'file_chip_container' 选择器，跳过文件上传确认。")
             return False
+        chip_selector = (
+            f"{self.file_chip_container_selector}"
+            f"//*[contains(normalize-space(.), {xpath_literal(file_name)}) and not(*[contains(normalize-space(.), {xpath_literal(file_name)})])]"
+        )
+        return await self.browser_manager.wait_for_state(chip_selector, 'visible', timeout=timeout)
 
-    def save_response_to_file(self, response: str, output_path: str):
-        """将响应保存到文件"""
-        try:
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.write(response)
-            self.logger.info(f"响应已成功保存到: {output_path}")
-        except Exception as e:
-            self.logger.error(f"保存响应到文件时出错: {e}")
-            
     async def generate_content(self, prompt: str, article_file: Optional[str] = None) -> Optional[str]:
         """
         执行完整的Monica文章生成工作流。
@@ -253,24 +393,13 @@ class MonicaAutomator:
             self.logger.info(f"接收到文件 '{article_file}'，正在尝试上传...")
             if await self.upload_file(article_file):
                 self.logger.info("✅ 文件上传成功，等待文件处理完成...")
-                # 等待文件上传和处理完成
-                await asyncio.sleep(3)
-                
-                # 再次检查文件是否真的上传成功
-                file_name = os.path.basename(article_file)
-                check_script = f"""
-                    (function() {{
-                        try {{
-                            var pageText = document.body.textContent || '';
-                            return pageText.includes('{file_name}');
-                        }} catch (error) {{
-                            console.log('❌ 检查文件状态出错: ' + error.message);
-                            return false;
-                        }}
-                    }})()
-                """
-                
-                file_confirmed = await self.browser_manager.execute_script(check_script)
+                # 输入框就绪和文件确认互不依赖，并发等待；各自在条件满足时立即返回，无需固定等待
+                input_ready, file_confirmed = await asyncio.gather(
+                    self.browser_manager.wait_for_state(self.chat_input_selector, 'visible', timeout=10),
+                    self._wait_for_file_chip(os.path.basename(article_file)),
+                )
+                if not input_ready:
+                    self.logger.warning("⚠️ 上传后聊天输入框未处于可见状态，继续尝试发送")
                 if file_confirmed:
                     self.logger.info("✅ 文件上传确认成功，可以继续发送提示词")
                 else:
@@ -324,37 +453,57 @@ class MonicaAutomator:
 
     # --- 文件上传相关方法 ---
     async def upload_file(self, file_path: str) -> bool:
-        """使用新的BrowserManager方法上传文件。"""
+        """
+        上传文件：优先直接为页面中的<input type="file">设置文件路径（由浏览器自行读取文件），
+        找不到该元素时再回退到点击上传按钮、通过文件选择对话框上传。
+        """
         absolute_path = os.path.abspath(file_path)
-        if not os.path.exists(absolute_path):
+        if not file_exists_cached(absolute_path):
             self.logger.error(f"文件不存在，无法上传: {absolute_path}")
             return False
 
+        self.logger.info(f"📁 开始上传文件: {file_path}")
+
+        if self.file_input_selector:
+            self.logger.info(f"尝试直接设置文件输入元素: {self.file_input_selector}")
+            if await self.browser_manager.set_input_files_for_hidden_element(
+                self.file_input_selector, absolute_path, timeout=3
+            ):
+                return True
+            self.logger.info("直接设置文件输入元素失败，回退到文件选择对话框方式。")
+
         if not self.upload_button_selector:
             self.logger.error("配置中缺少 'upload_button' 选择器。")
             return False
 
-        self.logger.info(f"📁 开始上传文件: {file_path}")
         self.logger.info(f"使用上传按钮选择器: {self.upload_button_selector}")
-
-        # 直接调用新的、职责明确的方法
-        return await self.browser_manager.upload_file_with_dialog(
+        success = await self.browser_manager.upload_file_with_dialog(
             self.upload_button_selector, absolute_path
         )
+        if not success:
+            forget_file(absolute_path)
+        return success
 
-    def save_content(self, markdown_content: str, output_file: str) -> bool:
-        """保存内容到文件"""
+    async def save_content(self, markdown_content: str, output_file: str) -> bool:
+        """保存内容到文件（在线程中写入，避免阻塞事件循环）"""
         self.logger.info(f"正在保存内容到: {output_file}")
         try:
-            os.makedirs(os.path.dirname(output_file), exist_ok=True)
-            with open(output_file, 'w', encoding='utf-8') as f:
-                f.write(markdown_content)
+            await asyncio.to_thread(self._write_text, markdown_content, output_file)
             self.logger.info("内容保存成功。")
             return True
         except Exception as e:
             self.logger.error(f"保存文件失败: {e}", exc_info=True)
             return False
 
+    @staticmethod
+    def _write_text(content: str, output_file: str):
+        """同步写入文件，目标目录不存在时先创建"""
+        output_dir = os.path.dirname(output_file)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        with open(output_file, 'w', encoding='utf-8') as f:
+            f.write(content)
+
     async def compose_article(self, title: str, attachment_path: Optional[str] = None, 
                             min_words: int = 800, prompt: str = '', continue_prompt: str = '') -> Optional[str]:
         """
@@ -370,14 +519,17 @@ class MonicaAutomator:
             
             # 2. 上传附件（如果有）
             if attachment_path:
-                if os.path.exists(attachment_path):
+                if file_exists_cached(os.path.abspath(attachment_path)):
                     self.logger.info(f"开始上传附件: {attachment_path}")
                     if not await self.upload_file(attachment_path):
                         self.logger.warning("附件上传失败，继续进行文章创作")
                     else:
                         self.logger.info("附件上传成功")
-                        # 等待文件处理完成
-                        await asyncio.sleep(3)
+                        # 等待附件标签出现，确认文件处理完成（出现即继续，不再固定等待）
+                        if await self._wait_for_file_chip(os.path.basename(attachment_path), timeout=15):
+                            self.logger.info("附件已在输入区显示，文件处理完成")
+                        else:
+                            self.logger.warning("未能确认附件处理完成，继续进行文章创作")
                 else:
                     self.logger.warning(f"附件文件不存在: {attachment_path}")
             
@@ -403,17 +555,14 @@ class MonicaAutomator:
                 return None
             
             # 6. 将HTML转换为Markdown（如果需要）
-            if '<' in content and '>' in content:
-                # 看起来是HTML，转换为Markdown
-                from markdownify import markdownify as md
-                content = md(content, heading_style="ATX")
-                # 清理多余的空行
-                import re
-                content = re.sub(r'\n\s*\n\s*\n', '\n\n', content)
-                content = content.strip()
+            if _HTML_TAG.search(content):
+                # 是HTML，在线程中转换为Markdown，避免阻塞事件循环
+                content = await asyncio.to_thread(html_to_markdown, content)
             
             # 7. 检查字数，如果不够则继续生成
-            word_count = len(content.replace(' ', '').replace('\n', ''))
+            # 各段内容先收集到列表，最后一次性拼接，避免反复复制已有内容
+            parts = [content]
+            word_count = count_chars(content)
             self.logger.info(f"初次生成内容字数: {word_count}")
             
             if word_count < min_words and continue_prompt:
@@ -424,29 +573,26 @@ class MonicaAutomator:
                 
                 if not await self.send_prompt(continue_full_prompt):
                     self.logger.warning("发送继续生成提示失败，返回当前内容")
-                    return content
+                    return "\n\n".join(parts)
                 
                 if not await self.wait_for_generation_to_complete():
                     self.logger.warning("等待继续生成完成失败，返回当前内容")
-                    return content
+                    return "\n\n".join(parts)
                 
                 # 获取继续生成的内容
                 additional_content = await self.get_response()
                 if additional_content:
                     # 将HTML转换为Markdown（如果需要）
-                    if '<' in additional_content and '>' in additional_content:
-                        additional_content = md(additional_content, heading_style="ATX")
-                        additional_content = re.sub(r'\n\s*\n\s*\n', '\n\n', additional_content)
-                        additional_content = additional_content.strip()
+                    if _HTML_TAG.search(additional_content):
+                        additional_content = await asyncio.to_thread(html_to_markdown, additional_content)
                     
-                    # 合并内容
-                    content = content + "\n\n" + additional_content
-                    final_word_count = len(content.replace(' ', '').replace('\n', ''))
-                    self.logger.info(f"继续生成后总字数: {final_word_count}")
+                    parts.append(additional_content)
+                    # 只统计新增部分，累加到已有字数上
+                    word_count += count_chars(additional_content)
+                    self.logger.info(f"继续生成后总字数: {word_count}")
             
-            final_word_count = len(content.replace(' ', '').replace('\n', ''))
-            self.logger.info(f"文章创作完成，最终字数: {final_word_count}")
-            return content
+            self.logger.info(f"文章创作完成，最终字数: {word_count}")
+            return "\n\n".join(parts)
             
         except Exception as e:
             self.logger.error(f"文章创作过程中出现错误: {e}", exc_info=True)
@@ -482,7 +628,8 @@ class MonicaAutomator:
             self.logger.info("第四步：获取并保存响应...")
             response = await self.get_response()
             if response:
-                self.save_response_to_file(response, output_path)
+                if not await self.save_content(response, output_path):
+                    return False
                 self.logger.info(f"成功获取响应并保存到 {output_path}")
                 return True
             else:
@@ -1,12 +1,143 @@
 import os
-import time
 import json
 import logging
-import re
 from typing import Optional
 import asyncio
-
-from .browser_manager import BrowserManager
+import copy
+
+from .browser_manager import BrowserManager, xpath_literal
+from .html_markdown import html_to_markdown
+from .automator_utils import count_chars, file_exists_cached, forget_file, load_config_cached
+
+# 定位最后一条回复（支持CSS和XPath选择器），在其副本上移除末尾的时间戳后返回innerHTML。
+# 脚本为模块常量，选择器通过参数传入，一次浏览器往返完成全部工作。
+_GET_LAST_RESPONSE_JS = """
+(selector) => {
+    // Markdown转换只会用到这些属性
+    const KEEP_ATTRS = new Set(['href', 'src', 'alt', 'title', 'colspan', 'rowspan']);
+    let element = null;
+    if (selector.startsWith('/') || selector.startsWith('(/')) {
+        const result = window.__xpEval
+            ? window.__xpEval(selector)
+            : document.evaluate(selector, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+        if (result.snapshotLength > 0) {
+            element = result.snapshotItem(result.snapshotLength - 1);
+        }
+    } else {
+        const elements = document.querySelectorAll(selector);
+        if (elements.length > 0) {
+            element = elements[elements.length - 1];
+        }
+    }
+    if (!element) { return null; }
+
+    const clonedElement = element.cloneNode(true);
+    const lastChild = clonedElement.lastElementChild;
+    if (lastChild && /^\\s*\\d{1,2}:\\d{2}(:\\d{2})?\\s*$/.test(lastChild.textContent)) {
+        lastChild.remove();
+    }
+    // 在浏览器端剔除与正文无关的节点和属性，缩小传回Python的HTML体积及后续解析量
+    clonedElement.querySelectorAll('svg, button, script, style, noscript').forEach(n => n.remove());
+    for (const node of clonedElement.querySelectorAll('*')) {
+        for (const name of node.getAttributeNames()) {
+            if (!KEEP_ATTRS.has(name)) { node.removeAttribute(name); }
+        }
+    }
+    return clonedElement.innerHTML;
+}
+"""
+
+
+# 连续两次取到的最后一条回复HTML相同（且非空）时返回true，用于确认停止按钮消失后最终渲染已完成。
+# 上一次的结果保存在 window.__aiLastResponse 中，每次开始等待前需先清除
+_RESPONSE_SETTLED_JS = """
+(selector) => {
+    const html = (""" + _GET_LAST_RESPONSE_JS.strip() + """)(selector);
+    const previous = window.__aiLastResponse;
+    window.__aiLastResponse = html;
+    return !!html && html === previous;
+}
+"""
+
+
+# XPath选择器匹配到至少一个元素时返回true，用于确认附件已显示在页面上
+_XPATH_EXISTS_JS = """
+(selector) => {
+    const result = window.__xpEval
+        ? window.__xpEval(selector)
+        : document.evaluate(selector, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    return result.snapshotLength > 0;
+}
+"""
+
+
+# 查找停止按钮：通过选择器（XPath或CSS）找到后打上 data-ai-stop 标记（值为当时的文本）。
+# 之后的检查先用CSS属性选择器直接命中；标记节点已不可见、被移除或文本已变化时才重新求值原选择器，
+# 因此生成过程中（按钮一直可见）的每次检查都不再执行XPath
+_FIND_STOP_BUTTON_JS = """
+const isShown = (element) => element.getClientRects().length > 0
+    && getComputedStyle(element).visibility !== 'hidden';
+const isStopVisible = (selector) => {
+    const tagged = document.querySelector('[data-ai-stop]');
+    if (tagged) {
+        if (tagged.textContent === tagged.dataset.aiStop && isShown(tagged)) return true;
+        delete tagged.dataset.aiStop;
+    }
+    let element = null;
+    if (selector.startsWith('/') || selector.startsWith('(/')) {
+        const result = window.__xpEval
+            ? window.__xpEval(selector)
+            : document.evaluate(selector, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+        element = result.snapshotLength > 0 ? result.snapshotItem(0) : null;
+    } else {
+        element = document.querySelector(selector);
+    }
+    if (!element) return false;
+    element.dataset.aiStop = element.textContent;
+    return isShown(element);
+};
+"""
+
+
+# 判断停止按钮是否可见；%s 处填入JSON序列化后的选择器
+_STOP_VISIBLE_EXPR_TEMPLATE = """
+(() => {
+""" + _FIND_STOP_BUTTON_JS.replace('%', '%%') + """
+    return isStopVisible(%s);
+})()
+"""
+
+
+# 在页面内用MutationObserver等待停止按钮消失：DOM变化时（最多每100毫秒）检查一次可见性，
+# 按钮消失时返回true，超时返回false。Python端只需等待这一次evaluate。
+_WAIT_STOP_GONE_JS = """
+({selector, timeoutMs}) => new Promise((resolve) => {
+""" + _FIND_STOP_BUTTON_JS + """
+    const isVisible = () => isStopVisible(selector);
+    if (!isVisible()) {
+        resolve(true);
+        return;
+    }
+    let scheduled = false;
+    const observer = new MutationObserver(() => {
+        if (scheduled) return;
+        scheduled = true;
+        setTimeout(() => {
+            scheduled = false;
+            if (!isVisible()) finish(true);
+        }, 100);
+    });
+    const timer = setTimeout(() => finish(false), timeoutMs);
+    function finish(result) {
+        observer.disconnect();
+        clearTimeout(timer);
+        resolve(result);
+    }
+    observer.observe(document.body, {
+        childList: true, subtree: true, attributes: true, attributeFilter: ['style', 'class', 'hidden']
+    });
+})
+"""
 
 
 class PoeAutomator:
@@ -14,7 +145,8 @@ class PoeAutomator:
 
     def __init__(self, gui_config: dict, browser_manager: BrowserManager, model_url: str):
         self.browser_manager = browser_manager
-        self.logger = self._setup_logging()
+        # 设置日志（全局日志配置由程序入口 main.py 负责）
+        self.logger = logging.getLogger(__name__)
         self.model_url = model_url
 
         # 加载并合并配置
@@ -24,36 +156,53 @@ class PoeAutomator:
 
         # 提取常用配置项
         self.selectors = self.config.get('selectors', {}).get('chat', {})
+        # 可用CSS表达的选择器优先使用CSS（querySelector比XPath求值更快）
+        self.css_selectors = self.config.get('selectors', {}).get('chat_css', {})
         self.timeouts = self.config.get('timeouts', {})
         self.urls = self.config.get('urls', {})
         
+        # 常用选择器和超时时间在初始化时一次性解析为属性；缺失的选择器在此处立即报错
+        self._sel_chat_input = self._get_selector('chat_input')
+        self._sel_send_button = self._get_selector('send_button')
+        self._sel_stop_button = self._get_selector('stop_button')
+        self._sel_last_response = self._get_selector('last_response')
+        self._sel_file_input = self._get_selector('file_input')
+        self._timeout_page_load = self.timeouts.get('page_load', 30)
+        self._timeout_ai_response = self.timeouts.get('ai_response_wait', 300)
+        self._timeout_upload = self.timeouts.get('upload_wait', 10)
+        
+        # 预先构建常用元素的Locator，各调用点复用同一对象
+        self.chat_input_loc = self.browser_manager.get_locator(self._sel_chat_input)
+        self.send_button_loc = self.browser_manager.get_locator(self._sel_send_button)
+        
+        # 停止按钮可见性判断表达式只构建一次，供CDP直接轮询
+        self._stop_visible_expr = (
+            _STOP_VISIBLE_EXPR_TEMPLATE % json.dumps(self._sel_stop_button) if self._sel_stop_button else None
+        )
+        
         self.logger.info(f"POE自动化器初始化完成，目标URL: {self.model_url}")
 
-    def _setup_logging(self):
-        """设置日志记录器"""
-        logger = logging.getLogger('PoeAutomator')
-        if not logger.handlers:
-            handler = logging.StreamHandler()
-            formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-            handler.setFormatter(formatter)
-            logger.addHandler(handler)
-            logger.setLevel(logging.INFO)
-        return logger
-
     def _load_config(self, config_file: str) -> dict:
         """从JSON文件加载配置"""
         try:
-            if os.path.exists(config_file):
-                with open(config_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+            # 一次stat同时完成存在性检查与修改时间获取
+            mtime = os.stat(config_file).st_mtime
+        except FileNotFoundError:
             self.logger.warning(f"配置文件 {config_file} 不存在，将使用默认或GUI传入的配置。")
+            return {}
+        except OSError as e:
+            self.logger.error(f"加载配置文件 {config_file} 失败: {e}")
+            return {}
+        try:
+            # 返回深拷贝，调用方修改配置不会污染缓存
+            return copy.deepcopy(load_config_cached(config_file, mtime))
         except Exception as e:
             self.logger.error(f"加载配置文件 {config_file} 失败: {e}")
         return {}
     
     def _get_selector(self, name: str) -> Optional[str]:
-        """从配置中安全地获取选择器"""
-        selector = self.selectors.get(name)
+        """从配置中安全地获取选择器（CSS优先，否则为XPath）"""
+        selector = self.css_selectors.get(name) or self.selectors.get(name)
         if not selector:
             self.logger.error(f"在配置中未找到选择器: '{name}'")
         return selector
@@ -65,15 +214,17 @@ class PoeAutomator:
             if not await self.browser_manager.navigate(self.model_url):
                 raise ConnectionError("浏览器导航失败")
             
-            await asyncio.sleep(2) # 等待页面初步加载
+            # 安装XPath表达式缓存，后续查询复用已编译的表达式
+            await self.browser_manager.install_xpath_cache()
             
-            chat_input_selector = self._get_selector('chat_input')
-            if not chat_input_selector: return False
+            if not self.chat_input_loc: return False
 
-            element = await self.browser_manager.find_element(
-                chat_input_selector, timeout=self.timeouts.get('page_load', 30)
-            )
-            if not element:
+            # 直接等待输入框可见即代表页面就绪，不再预先固定等待
+            try:
+                await self.chat_input_loc.wait_for(
+                    state='visible', timeout=self._timeout_page_load * 1000
+                )
+            except Exception:
                 self.logger.error("导航后未能找到聊天输入框，页面可能未正确加载。")
                 return False
 
@@ -88,11 +239,11 @@ class PoeAutomator:
         使用BrowserManager为隐藏的input元素设置文件路径。
         """
         self.logger.info(f"开始直接上传文件: {file_path}")
-        if not os.path.exists(file_path):
+        if not file_exists_cached(file_path):
             self.logger.error(f"素材文件不存在: {file_path}")
             return False
 
-        file_input_selector = self._get_selector('file_input')
+        file_input_selector = self._sel_file_input
         if not file_input_selector:
             return False
 
@@ -103,9 +254,18 @@ class PoeAutomator:
 
         if success:
             self.logger.info(f"文件上传操作已提交: {file_path}")
-            await asyncio.sleep(3) # 等待文件处理
+            # 等待页面上出现该附件的文件名，而不是固定等待
+            file_name = os.path.basename(file_path)
+            attachment_selector = f"//*[contains(text(), {xpath_literal(file_name)})]"
+            if await self.browser_manager.wait_for_predicate(
+                _XPATH_EXISTS_JS, attachment_selector, timeout=self._timeout_upload
+            ):
+                self.logger.info("附件已显示在页面上，文件处理完成。")
+            else:
+                self.logger.warning("未能确认附件已显示在页面上，继续执行。")
         else:
             self.logger.error(f"为隐藏元素设置文件 '{file_path}' 失败。")
+            forget_file(file_path)
 
         return success
 
@@ -113,23 +273,19 @@ class PoeAutomator:
         """在文本框中输入提示并点击发送。"""
         self.logger.info("开始发送提示...")
         try:
-            chat_input_selector = self._get_selector('chat_input')
-            send_button_selector = self._get_selector('send_button')
-            if not chat_input_selector or not send_button_selector:
+            if not self.chat_input_loc or not self.send_button_loc:
                 return False
 
             self.logger.info("正在输入提示文本...")
-            if not await self.browser_manager.focus_and_type_text(chat_input_selector, prompt):
-                 self.logger.error(f"输入提示失败: {chat_input_selector}")
-                 return False
-
-            self.logger.info(f"正在点击发送按钮: {send_button_selector}")
-            send_button = await self.browser_manager.find_element(send_button_selector)
-            if not send_button or not await send_button.is_enabled():
-                self.logger.error("发送按钮未找到或不可用。")
+            # fill() 会自动等待元素可编辑并清空原有内容
+            await self.chat_input_loc.fill(prompt)
+
+            self.logger.info("正在点击发送按钮...")
+            if not await self.send_button_loc.is_enabled():
+                self.logger.error("发送按钮不可用。")
                 return False
             
-            await send_button.click()
+            await self.send_button_loc.click()
 
             self.logger.info("提示已成功发送。")
             return True
@@ -141,79 +297,89 @@ class PoeAutomator:
         """等待内容生成完成。"""
         self.logger.info("等待内容生成完成...")
         try:
-            stop_button_selector = self._get_selector('stop_button')
-            if not stop_button_selector:
+            if not self._sel_stop_button:
                 return False
             
-            timeout = self.timeouts.get('ai_response_wait', 300) * 1000 # 转换为毫秒
+            timeout = self._timeout_ai_response
 
             self.logger.info("等待'停止'按钮出现...")
-            stop_button = await self.browser_manager.find_element(stop_button_selector, timeout=15)
-            
-            if not stop_button:
+            if not await self._wait_stop_button(visible=True, timeout=15):
                 self.logger.warning("在15秒内未检测到'停止'按钮，可能已秒速生成或未开始。继续。")
                 return True
 
             self.logger.info("'停止'按钮已出现，内容正在生成中。")
             self.logger.info("等待'停止'按钮消失...")
             
-            await stop_button.wait_for(state='hidden', timeout=timeout)
+            if not await self._wait_stop_button(visible=False, timeout=timeout):
+                self.logger.error(f"'停止'按钮在 {timeout} 秒后仍未消失。")
+                return False
             
             self.logger.info("'停止'按钮已消失，内容生成完成。")
-            await asyncio.sleep(2) # 等待UI更新
+            # 按钮消失后回复区域可能还在做最后的Markdown/代码块渲染，等待内容稳定后再提取（最多2秒）
+            await self._wait_response_settled(timeout=2)
             return True
 
         except Exception as e:
             self.logger.error(f"等待生成完成时出现异常: {e}", exc_info=True)
             return False
 
+    async def _wait_stop_button(self, visible: bool, timeout: float) -> bool:
+        """
+        等待停止按钮出现（visible=True）或消失（visible=False）。
+        等待消失时优先在页面内用MutationObserver监听，一次evaluate即可等到结果；
+        否则通过CDP直接轮询，轮询间隔自适应（出现检查最长1秒，消失检查最长4秒）；
+        CDP不可用时回退到Playwright的元素状态等待。
+        """
+        if not visible:
+            gone = await self.browser_manager.execute_script(
+                _WAIT_STOP_GONE_JS, {'selector': self._sel_stop_button, 'timeoutMs': timeout * 1000}
+            )
+            if gone is not None:
+                return bool(gone)
+            self.logger.debug("页面内监听停止按钮失败，回退到轮询等待。")
+
+        expression = self._stop_visible_expr if visible else f"!({self._stop_visible_expr})"
+        try:
+            return await self.browser_manager.cdp_wait_for(
+                expression, timeout=timeout, cap=1.0 if visible else 4.0
+            )
+        except Exception as e:
+            self.logger.debug(f"CDP轮询停止按钮失败，回退到Playwright等待: {e}")
+            return await self.browser_manager.wait_for_state(
+                self._sel_stop_button, 'visible' if visible else 'hidden', timeout=timeout
+            )
+
+    async def _wait_response_settled(self, timeout: float = 2) -> bool:
+        """等待最后一条回复的HTML连续两次读取结果相同，超时后继续提取当前内容"""
+        if not self._sel_last_response:
+            return False
+        await self.browser_manager.execute_script("() => { delete window.__aiLastResponse; }")
+        settled = await self.browser_manager.wait_for_predicate(
+            _RESPONSE_SETTLED_JS, self._sel_last_response, timeout=timeout, initial=0.2, cap=0.5
+        )
+        if not settled:
+            self.logger.warning(f"回复内容在 {timeout} 秒内仍在变化，继续提取当前内容。")
+        return settled
+
     async def get_latest_response(self) -> Optional[str]:
         """
         获取最后一条机器人消息的HTML，并转换为Markdown格式。
         """
         self.logger.info("正在获取最新生成的内容...")
         try:
-            response_selector = self._get_selector('last_response')
+            response_selector = self._sel_last_response
             if not response_selector:
                 return None
             
-            # 使用Playwright的locator来获取所有匹配的元素
-            response_elements = await self.browser_manager.find_elements(response_selector)
-            if not response_elements:
+            # 一次 page.evaluate 完成：定位最后一条回复 + 移除时间戳 + 取回HTML
+            html_content = await self.browser_manager.execute_script(_GET_LAST_RESPONSE_JS, response_selector)
+            if html_content is None:
                 self.logger.warning(f"未能找到任何回复元素。选择器: {response_selector}")
                 return None
 
-            # 获取最后一个元素
-            last_response_element = response_elements[-1]
-            
-            # 在最后一个元素上执行脚本，移除时间戳
-            js_script = """
-            (element) => {
-                if (!element) { return null; }
-                
-                var clonedElement = element.cloneNode(true);
-                var lastChild = clonedElement.lastElementChild;
-                if (lastChild) {
-                    var timestampRegex = /^\\s*\\d{1,2}:\\d{2}(:\\d{2})?\\s*$/;
-                    if (timestampRegex.test(lastChild.innerText)) {
-                        lastChild.remove();
-                    }
-                }
-                return clonedElement.innerHTML;
-            }
-            """
-            
-            html_content = await last_response_element.evaluate(js_script)
-
             if html_content and html_content.strip():
-                # 将HTML转换为Markdown
-                from markdownify import markdownify as md
-                markdown_content = md(html_content, heading_style="ATX")
-                
-                # 清理多余的空行
-                import re
-                markdown_content = re.sub(r'\n\s*\n\s*\n', '\n\n', markdown_content)
-                markdown_content = markdown_content.strip()
+                # 将HTML转换为Markdown（在线程中执行，避免阻塞事件循环）
+                markdown_content = await asyncio.to_thread(html_to_markdown, html_content)
                 
                 self.logger.info(f"成功获取并转换内容为Markdown，长度为 {len(markdown_content)} 字符。")
                 return markdown_content
@@ -296,7 +462,7 @@ class PoeAutomator:
             
             # 2. 上传附件（如果有）
             if attachment_path:
-                if os.path.exists(attachment_path):
+                if file_exists_cached(attachment_path):
                     self.logger.info(f"开始上传附件: {attachment_path}")
                     if not await self.upload_file(attachment_path):
                         self.logger.warning("附件上传失败，继续进行文章创作")
@@ -327,7 +493,9 @@ class PoeAutomator:
                 return None
             
             # 6. 检查字数，如果不够则继续生成
-            word_count = len(content.replace(' ', '').replace('\n', ''))
+            # 各段内容先收集到列表，最后一次性拼接，避免反复复制已有内容
+            parts = [content]
+            word_count = count_chars(content)
             self.logger.info(f"初次生成内容字数: {word_count}")
             
             if word_count < min_words and continue_prompt:
@@ -338,23 +506,22 @@ class PoeAutomator:
                 
                 if not await self.send_prompt(continue_full_prompt):
                     self.logger.warning("发送继续生成提示失败，返回当前内容")
-                    return content
+                    return "\n\n".join(parts)
                 
                 if not await self.wait_for_generation_to_complete():
                     self.logger.warning("等待继续生成完成失败，返回当前内容")
-                    return content
+                    return "\n\n".join(parts)
                 
                 # 获取继续生成的内容
                 additional_content = await self.get_latest_response()
                 if additional_content:
-                    # 合并内容
-                    content = content + "\n\n" + additional_content
-                    final_word_count = len(content.replace(' ', '').replace('\n', ''))
-                    self.logger.info(f"继续生成后总字数: {final_word_count}")
+                    parts.append(additional_content)
+                    # 只统计新增部分，累加到已有字数上
+                    word_count += count_chars(additional_content)
+                    self.logger.info(f"继续生成后总字数: {word_count}")
             
-            final_word_count = len(content.replace(' ', '').replace('\n', ''))
-            self.logger.info(f"文章创作完成，最终字数: {final_word_count}")
-            return content
+            self.logger.info(f"文章创作完成，最终字数: {word_count}")
+            return "\n\n".join(parts)
             
         except Exception as e:
             self.logger.error(f"文章创作过程中出现错误: {e}", exc_info=True)
@@ -1,13 +1,33 @@
 import json
 import os
 
+try:
+    import orjson  # 解析速度更快；未安装时回退到标准库json
+except ImportError:
+    orjson = None
+
+
 class QiniuConfig:
     """七牛云配置管理类"""
     
     def __init__(self, config_file="qiniu_config.json"):
         self.config_file = config_file
         self.load_error = None  # 用于记录加载过程中的错误
-        self.config = self.load_config()
+        self._config = None  # 首次访问 config 时才读取配置文件
+        self._validation = None  # validate() 的结果缓存，配置变更时清空
+    
+    @property
+    def config(self):
+        """配置字典，首次访问时才从文件加载"""
+        if self._config is None:
+            self._config = self.load_config()
+            self._validation = None
+        return self._config
+    
+    @config.setter
+    def config(self, value):
+        self._config = value
+        self._validation = None
     
     def load_config(self):
         """加载七牛云配置"""
@@ -16,18 +36,20 @@ class QiniuConfig:
             "secret_key": "",
             "bucket_name": "",
             "domain": "",
-            "enabled": False
+            "enabled": False,
+            "token_ttl": 3600  # 上传凭证有效期（秒）
         }
         
         if os.path.exists(self.config_file):
             try:
-                with open(self.config_file, 'r', encoding='utf-8') as f:
-                    config = json.load(f)
-                    # 合并默认配置，确保所有字段都存在
-                    for key, value in default_config.items():
-                        if key not in config:
-                            config[key] = value
-                    return config
+                with open(self.config_file, 'rb') as f:
+                    data = f.read()
+                config = orjson.loads(data) if orjson else json.loads(data)
+                # 合并默认配置，确保所有字段都存在
+                for key, value in default_config.items():
+                    if key not in config:
+                        config[key] = value
+                return config
             except Exception as e:
                 error_message = f"加载七牛云配置文件 '{self.config_file}' 失败: {e}"
                 print(error_message)
@@ -40,23 +62,33 @@ class QiniuConfig:
     def save_config(self):
         """保存七牛云配置"""
         try:
-            with open(self.config_file, 'w', encoding='utf-8') as f:
-                json.dump(self.config, f, ensure_ascii=False, indent=2)
+            if orjson:
+                # orjson 直接输出UTF-8字节，中文不转义，与 ensure_ascii=False 一致
+                data = orjson.dumps(self.config, option=orjson.OPT_INDENT_2)
+            else:
+                data = json.dumps(self.config, ensure_ascii=False, indent=2).encode('utf-8')
+            with open(self.config_file, 'wb') as f:
+                f.write(data)
             return True
         except Exception as e:
             print(f"保存七牛云配置失败: {e}")
             return False
     
+    def _apply_changes(self, changes):
+        """更新配置、清空验证缓存并立即写回文件，返回是否已保存到磁盘"""
+        self.config.update(changes)
+        self._validation = None
+        return self.save_config()
+    
     def set_config(self, access_key, secret_key, bucket_name, domain="", enabled=True):
         """设置七牛云配置"""
-        self.config.update({
+        return self._apply_changes({
             "access_key": access_key,
             "secret_key": secret_key,
             "bucket_name": bucket_name,
             "domain": domain,
             "enabled": enabled
         })
-        return self.save_config()
     
     def get_config(self):
         """获取七牛云配置"""
@@ -68,19 +100,26 @@ class QiniuConfig:
         Returns:
             tuple: (bool, str) -> (是否有效, 提示信息)
         """
+        config = self.config  # 触发延迟加载，load_error 在加载时设置
+        if self._validation is None:
+            self._validation = self._validate(config)
+        return self._validation
+
+    def _validate(self, config):
+        """逐项检查配置，结果由 validate() 缓存"""
         if self.load_error:
             return (False, f"七牛云配置文件 '{self.config_file}' 读取失败: {self.load_error}")
 
-        if not self.config.get("enabled", False):
+        if not config.get("enabled", False):
             return (False, "七牛云功能未在 qiniu_config.json 中启用 (请确保 \"enabled\": true)。")
         
-        if not self.config.get("access_key"):
+        if not config.get("access_key"):
             return (False, "配置错误: 'access_key' 不能为空。")
         
-        if not self.config.get("secret_key"):
+        if not config.get("secret_key"):
             return (False, "配置错误: 'secret_key' 不能为空。")
             
-        if not self.config.get("bucket_name"):
+        if not config.get("bucket_name"):
             return (False, "配置错误: 'bucket_name' 不能为空。")
             
         return (True, "七牛云配置完整有效。")
@@ -106,18 +145,20 @@ class QiniuConfig:
         """获取自定义域名"""
         return self.config.get("domain", "")
     
+    def get_token_ttl(self):
+        """获取上传凭证有效期（秒）"""
+        return self.config.get("token_ttl", 3600)
+    
     def disable(self):
         """禁用七牛云"""
-        self.config["enabled"] = False
-        return self.save_config()
+        return self._apply_changes({"enabled": False})
     
     def enable(self):
         """启用七牛云"""
         if (self.config.get("access_key") and 
             self.config.get("secret_key") and 
             self.config.get("bucket_name")):
-            self.config["enabled"] = True
-            return self.save_config()
+            return self._apply_changes({"enabled": True})
         else:
             print("七牛云配置不完整，无法启用")
             return False 
\ No newline at end of file
@@ -1,21 +1,151 @@
 import os
+import copy
 import asyncio
 import json
 import logging
-from typing import List, Dict, Any, Optional
+import re
+from typing import List, Dict, Any, Optional, Tuple
 from playwright.async_api import Page
 from .browser_manager import BrowserManager
 from .image_handler import ImageHandler
 from .qiniu_config import QiniuConfig
-import traceback
+from .automator_utils import load_config_cached
+from urllib.parse import quote, urlencode, urljoin, urlparse
+
+
+# 常见的图片备注文字 - 使用句子边界来精确匹配。
+# 各种写法合并为一个分支表达式，正文只需扫描一遍：从左到右逐处删除匹配，同一位置按分支先后取第一个匹配的写法。
+# 这与原先逐条表达式依次删除的结果并不完全相同（前一条删除后拼接出的文字不会再被后面的表达式匹配）
+_IMAGE_NOTE_RE = re.compile('|'.join((
+    r'图片来源于网络[，。、]*[^。！？\n]*[。！？]?',
+    r'图片来源：[^。！？\n]*[。！？]?',
+    r'图源：[^。！？\n]*[。！？]?',
+    r'配图来源[^。！？\n]*[。！？]?',
+    r'（图片来源[^）]*）',
+    r'\(图片来源[^)]*\)',
+    r'【图片来源[^】]*】',
+    r'图片版权归[^。！？\n]*[。！？]?',
+    r'图片仅供参考[^。！？\n]*[。！？]?',
+    r'图片与内容无关[^。！？\n]*[。！？]?',
+    r'图片为配图[^。！？\n]*[。！？]?',
+    r'网络配图[。！？]?',
+    r'图片来自网络[^。！？\n]*[。！？]?',
+    r'图片素材来源[^。！？\n]*[。！？]?',
+    r'图片来源网络[^。！？\n]*[。！？]?',
+)), re.IGNORECASE)
+
+# 移除图片备注后依次执行的清理规则：(已编译的模式, 替换文本或替换函数)
+# 互不依赖的规则合并为一个分支表达式，每条规则只扫描一遍正文
+_CLEANUP_RULES = [(re.compile(pattern), replacement) for pattern, replacement in (
+    # 清理空的括号和方括号
+    (r'（\s*）|【\s*】|\(\s*\)|\[\s*\]', ''),
+    # 修复因删除内容导致的语法问题
+    (r'(\w+)（\s*(\w+)', r'\1\2'),
+    # 清理标点符号（连续的标点统一折叠为逗号，此后正文中不会再出现句号）
+    (r'[，。、]*\s*[，。、]+', '，'),
+    (r'，\s*，', '，'),
+    # 清理空格和换行：空行折叠为一个空行，连续空格/制表符折叠为一个空格
+    (r'\n\s*\n|[ \t]+', lambda m: '\n\n' if m.group()[0] == '\n' else ' '),
+    # 移除开头和结尾的多余标点
+    (r'^[，。、\s]+|[，。、\s]+$', ''),
+)]
+
+
+def _normalize_selector(selector: str) -> str:
+    """把配置中的选择器转换为Playwright可直接使用的形式：以/开头的视为XPath"""
+    if selector[:1] == '/':
+        return f"xpath={selector}"
+    return selector
+
+
+def _normalize_selectors(node: Any) -> Any:
+    """递归转换选择器配置中的所有字符串（字典、列表结构保持不变）"""
+    if isinstance(node, str):
+        return _normalize_selector(node)
+    if isinstance(node, dict):
+        return {key: _normalize_selectors(value) for key, value in node.items()}
+    if isinstance(node, list):
+        return [_normalize_selectors(item) for item in node]
+    return node
+
+
+# 资讯频道搜索结果页的路径和固定参数，主机取自配置 urls.search_base
+_DIRECT_SEARCH_PATH = "search"
+_DIRECT_SEARCH_PARAMS = {"pd": "information", "source": "input"}
+_DEFAULT_SEARCH_BASE = "https://so.toutiao.com/"
+
+# 七牛云配置文件路径（与 QiniuConfig 的默认值一致）
+_QINIU_CONFIG_FILE = "qiniu_config.json"
+
+
+# 在页面内一次取出所有匹配元素的href属性，去掉空值和重复链接（保持页面顺序）
+_COLLECT_HREFS_JS = "els => [...new Set(els.map(e => e.getAttribute('href')).filter(Boolean))]"
+
+# 返回第一个能匹配到元素的文章链接选择器下第一条链接的href（选择器带xpath=前缀的按XPath处理）
+_FIRST_ARTICLE_HREF_JS = """sels => {
+    for (const s of sels) {
+        let el = null;
+        try {
+            el = s.startsWith('xpath=')
+                ? document.evaluate(s.slice(6), document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue
+                : document.querySelector(s);
+        } catch (e) { continue; }
+        const href = el && el.getAttribute && el.getAttribute('href');
+        if (href) return href;
+    }
+    return null;
+}"""
+
+# 翻页后等待结果列表刷新：第一条文章链接出现且与翻页前不同
+_RESULTS_CHANGED_JS = (
+    "([sels, previous]) => { const href = (" + _FIRST_ARTICLE_HREF_JS + ")(sels); "
+    "return !!href && href !== previous; }"
+)
+
+
+# 在页面内按顺序尝试选择器（带xpath=前缀的按XPath处理），返回第一个可见且非空元素的文本
+_FIRST_TEXT_JS = """sels => {
+    const first = s => s.startsWith('xpath=')
+        ? document.evaluate(s.slice(6), document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue
+        : document.querySelector(s);
+    for (const s of sels) {
+        let el = null;
+        try { el = first(s); } catch (e) { continue; }
+        if (!el || !el.getClientRects().length || getComputedStyle(el).visibility === 'hidden') continue;
+        const text = el.innerText;
+        if (text && text.trim()) return text;
+    }
+    return '';
+}"""
+
+# 在页面内按顺序尝试选择器，返回第一个能取到图片的选择器下所有图片的src属性
+_IMAGE_SRCS_JS = """sels => {
+    const all = s => {
+        if (!s.startsWith('xpath=')) return Array.from(document.querySelectorAll(s));
+        const snap = document.evaluate(s.slice(6), document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+        return Array.from({length: snap.snapshotLength}, (_, i) => snap.snapshotItem(i));
+    };
+    for (const s of sels) {
+        let els = [];
+        try { els = all(s); } catch (e) { continue; }
+        const srcs = els.map(e => e.getAttribute && e.getAttribute('src'))
+            .filter(src => src && (src.startsWith('http') || src.startsWith('//')));
+        if (srcs.length) return srcs;
+    }
+    return [];
+}"""
 
 
 class ToutiaoScraper:
     """基于Playwright的今日头条抓取器"""
     
+    # 七牛云配置在进程内共用一份，以配置文件的修改时间为键，文件未修改时不重新读取
+    _qiniu_cache: Optional[Tuple[Optional[float], QiniuConfig]] = None
+    
     def __init__(self, gui_config: Dict[str, Any], browser_manager: BrowserManager):
         self.browser_manager = browser_manager
-        self.setup_logging()
+        # 设置日志（全局日志配置由程序入口 main.py 负责）
+        self.logger = logging.getLogger(__name__)
         
         # 加载基础配置文件
         local_config = self.load_config('toutiao_config.json')
@@ -26,20 +156,20 @@ class ToutiaoScraper:
             if key in gui_config:
                 local_config[key] = gui_config[key]
         
+        # 选择器在初始化时统一转换一次，调用处不再逐次判断XPath前缀
+        if 'selectors' in local_config:
+            local_config['selectors'] = _normalize_selectors(local_config['selectors'])
+        verification = local_config.get('verification')
+        if isinstance(verification, dict) and 'selectors' in verification:
+            verification['selectors'] = _normalize_selectors(verification['selectors'])
+        
         self.config = local_config
+        # 图片处理器在首次处理图片时创建，之后复用（保留其HTTP连接池、上传凭证和链接缓存）
+        self._image_handler: Optional[ImageHandler] = None
+        # 各站点上成功匹配文章链接的选择器，翻页后优先尝试
+        self._article_selector_by_host: Dict[str, str] = {}
         self.logger.info("今日头条抓取器初始化完成")
     
-    def setup_logging(self):
-        """设置日志配置"""
-        self.logger = logging.getLogger('modules.toutiao_scraper')
-        if not self.logger.handlers:
-            handler = logging.StreamHandler()
-            formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-            handler.setFormatter(formatter)
-            self.logger.addHandler(handler)
-            self.logger.setLevel(logging.INFO)
-            self.logger.propagate = False
-    
     async def scrape_articles_and_images(self, keyword: str, scrape_articles: bool = True, scrape_images: bool = True) -> bool:
         """
         公开的主方法，用于根据需要抓取文章和/或图片链接。
@@ -75,11 +205,19 @@ class ToutiaoScraper:
 
     def _save_articles_content(self, articles_data: List[Dict[str, Any]]):
         """从抓取的数据中提取并保存文章内容。"""
-        article_texts = [article['content'] for article in articles_data if article.get('content')]
-        if article_texts:
+        if any(article.get('content') for article in articles_data):
+            # 逐篇写入文件，不再先拼接出完整字符串
+            saved = 0
             with open("article.txt", "w", encoding='utf-8') as f:
-                f.write("\n\n---\n\n".join(article_texts))
-            self.logger.info(f"已将 {len(article_texts)} 篇文章内容保存到 article.txt")
+                for article in articles_data:
+                    content = article.get('content')
+                    if not content:
+                        continue
+                    if saved:
+                        f.write("\n\n---\n\n")
+                    f.write(content)
+                    saved += 1
+            self.logger.info(f"已将 {saved} 篇文章内容保存到 article.txt")
         else:
             self.logger.info("抓取到的文章内容为空。")
 
@@ -87,6 +225,13 @@ class ToutiaoScraper:
         """
         从抓取的数据中提取、处理图片并保存七牛云链接。
         """
+        # 七牛云未配置时直接返回，不再整理图片列表（校验结果由QiniuConfig缓存）
+        qiniu_loader = self._get_qiniu_config()
+        is_valid, message = qiniu_loader.validate()
+        if not is_valid:
+            self.logger.warning(message)
+            return
+
         all_images_with_referer = [img for article in articles_data for img in article.get('images_with_referer', [])]
         max_images = self.config.get('image_count', 3)
         images_to_process = all_images_with_referer[:max_images]
@@ -95,56 +240,85 @@ class ToutiaoScraper:
             self.logger.info("未抓取到任何图片链接。")
             return
 
-        qiniu_loader = QiniuConfig()
-        is_valid, message = qiniu_loader.validate()
-        if not is_valid:
-            self.logger.warning(message)
-            return
-
-        qiniu_config = qiniu_loader.get_config()
-        # 只传递ImageHandler需要的参数
-        image_handler_config = {
-            'access_key': qiniu_config.get('access_key'),
-            'secret_key': qiniu_config.get('secret_key'),
-            'bucket_name': qiniu_config.get('bucket_name'),
-            'domain': qiniu_config.get('domain')
-        }
-        image_handler = ImageHandler(**image_handler_config)
+        if self._image_handler is None:
+            qiniu_config = qiniu_loader.get_config()
+            # 只传递ImageHandler需要的参数
+            image_handler_config = {
+                'access_key': qiniu_config.get('access_key'),
+                'secret_key': qiniu_config.get('secret_key'),
+                'bucket_name': qiniu_config.get('bucket_name'),
+                'domain': qiniu_config.get('domain'),
+                'token_ttl': qiniu_config.get('token_ttl')
+            }
+            self._image_handler = ImageHandler(**image_handler_config)
+        image_handler = self._image_handler
         
-        qiniu_links = []
-        crop_pixels = self.config.get('scraping', {}).get('crop_bottom_pixels', 80)
+        scraping_config = self.config.get('scraping', {})
+        crop_pixels = scraping_config.get('crop_bottom_pixels', 80)
         self.logger.info(f"图片处理：将从每张图片底部裁剪 {crop_pixels} 像素。")
         
-        for i, image_data in enumerate(images_to_process):
-            try:
-                url, referer = image_data['url'], image_data['referer']
-                self.logger.info(f"--- [图片 {i+1}/{len(images_to_process)}] 开始处理: {url} ---")
-                qiniu_link = image_handler.process_and_upload_image(url, crop_bottom_pixels=crop_pixels, referer=referer)
-                if qiniu_link:
-                    qiniu_links.append(qiniu_link)
-                    self.logger.info(f"图片成功上传到七牛云: {qiniu_link}")
-                else:
-                    self.logger.warning(f"图片处理或上传失败，跳过: {url}")
-            except Exception as e:
-                self.logger.error(f"处理单张图片时发生未知错误: {url}, 错误: {e}", exc_info=True)
+        # 下载/裁剪/上传都是阻塞操作，放到线程中并发执行，同时处理的图片数由信号量限制
+        semaphore = asyncio.Semaphore(max(1, scraping_config.get('max_concurrent_images', 4)))
+        total = len(images_to_process)
+        
+        async def process_one(i: int, image_data: Dict[str, str]) -> Optional[str]:
+            url, referer = image_data['url'], image_data['referer']
+            async with semaphore:
+                self.logger.info(f"--- [图片 {i+1}/{total}] 开始处理: {url} ---")
+                try:
+                    qiniu_link = await asyncio.to_thread(
+                        image_handler.process_and_upload_image, url, crop_bottom_pixels=crop_pixels, referer=referer
+                    )
+                except Exception as e:
+                    self.logger.error(f"处理单张图片时发生未知错误: {url}, 错误: {e}", exc_info=True)
+                    return None
+            if qiniu_link:
+                self.logger.info(f"图片成功上传到七牛云: {qiniu_link}")
+            else:
+                self.logger.warning(f"图片处理或上传失败，跳过: {url}")
+            return qiniu_link
+        
+        # gather 按输入顺序返回结果，链接顺序与图片在文章中的顺序一致
+        results = await asyncio.gather(*(process_one(i, img) for i, img in enumerate(images_to_process)))
+        qiniu_links = [link for link in results if link]
 
         if qiniu_links:
-            markdown_links = [f"![Image]({link})" for link in qiniu_links]
             with open("picture.txt", "w", encoding='utf-8') as f:
-                f.write("\n".join(markdown_links))
+                for i, link in enumerate(qiniu_links):
+                    if i:
+                        f.write("\n")
+                    f.write(f"![Image]({link})")
             self.logger.info(f"已将 {len(qiniu_links)} 个七牛云图片链接（Markdown格式）保存到 picture.txt")
         else:
             self.logger.warning("所有图片处理/上传均失败，picture.txt 为空。")
 
+    @classmethod
+    def _get_qiniu_config(cls) -> QiniuConfig:
+        """获取共用的七牛云配置对象，首次调用或配置文件被修改后重新创建"""
+        try:
+            mtime = os.stat(_QINIU_CONFIG_FILE).st_mtime
+        except OSError:
+            mtime = None
+        cached = cls._qiniu_cache
+        if cached is None or cached[0] != mtime:
+            cached = cls._qiniu_cache = (mtime, QiniuConfig(_QINIU_CONFIG_FILE))
+        return cached[1]
+
     def load_config(self, config_file: str) -> Dict[str, Any]:
         """加载配置文件"""
         try:
-            if os.path.exists(config_file):
-                with open(config_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+            try:
+                # 一次stat同时完成存在性检查与修改时间获取
+                mtime = os.stat(config_file).st_mtime
+            except FileNotFoundError:
+                mtime = None
+            if mtime is not None:
+                # 返回深拷贝，调用方修改配置不会污染缓存
+                return copy.deepcopy(load_config_cached(config_file, mtime))
             
             self.logger.info(f"配置文件 {config_file} 不存在，将创建并使用默认配置。")
             default_config = {
+                "urls": {"homepage": "https://www.toutiao.com/", "search_base": _DEFAULT_SEARCH_BASE},
                 "selectors": {
                     "homepage": {"search_input": "input[type='search']", "search_button": "button[type='submit']"},
                     "search_results": {
@@ -155,7 +329,7 @@ class ToutiaoScraper:
                     "article_page": {"content_containers": ["article", "div.article-content"], "title_selectors": ["h1.article-title", "h1"], "image_selectors": ["article img", "div.pgc-img img"]}
                 },
                 "timeouts": {"page_load": 30, "element_wait": 15, "search_delay": 5, "article_delay": 2},
-                "scraping": {"max_articles": 10, "max_pages": 5, "max_images": 5, "delay_between_requests": 2, "content_min_length": 100, "crop_bottom_pixels": 80}
+                "scraping": {"max_articles": 10, "max_pages": 5, "max_images": 5, "delay_between_requests": 2, "content_min_length": 100, "crop_bottom_pixels": 80, "max_concurrent_images": 4, "max_concurrent_articles": 3}
             }
             with open(config_file, 'w', encoding='utf-8') as f:
                 json.dump(default_config, f, ensure_ascii=False, indent=2)
@@ -168,7 +342,7 @@ class ToutiaoScraper:
     async def navigate_to_toutiao(self) -> bool:
         """导航到今日头条"""
         try:
-            await self.browser_manager.navigate("https://www.toutiao.com/")
+            await self.browser_manager.navigate(self.config.get('urls', {}).get('homepage') or "https://www.toutiao.com/")
             # 检查是否有验证码
             has_verification = await self._check_for_captcha()
             if has_verification:
@@ -193,54 +367,47 @@ class ToutiaoScraper:
         selectors = self.config.get('selectors', {})
         search_results_page = None
         try:
-            self.logger.info("准备在原始页面执行搜索...")
-            async with page.context.expect_page() as new_page_info:
-                # 使用修复后的元素定位方法
-                search_input_selector = selectors['homepage']['search_input']
-                search_button_selector = selectors['homepage']['search_button']
-                
-                # 支持XPath选择器
-                if search_input_selector.startswith('//') or search_input_selector.startswith('/'):
-                    search_input = page.locator(f"xpath={search_input_selector}")
-                else:
-                    search_input = page.locator(search_input_selector)
+            # 优先直接打开资讯搜索结果页，失败时再走首页搜索流程
+            search_results_page = await self._open_search_results_directly(page.context, keyword)
+            if search_results_page is None:
+                self.logger.info("准备在原始页面执行搜索...")
+                async with page.context.expect_page() as new_page_info:
+                    # 使用修复后的元素定位方法
+                    search_input = page.locator(selectors['homepage']['search_input'])
+                    search_button = page.locator(selectors['homepage']['search_button'])
                 
-                if search_button_selector.startswith('//') or search_button_selector.startswith('/'):
-                    search_button = page.locator(f"xpath={search_button_selector}")
-                else:
-                    search_button = page.locator(search_button_selector)
-                
-                await search_input.fill(keyword)
-                await search_button.click()
+                    await search_input.fill(keyword)
+                    await search_button.click()
             
-            search_results_page = await new_page_info.value
-            await search_results_page.wait_for_load_state()
-            self.logger.info("已捕获搜索结果新标签页。")
+                search_results_page = await new_page_info.value
+                await search_results_page.wait_for_load_state()
+                self.logger.info("已捕获搜索结果新标签页。")
             
-            # 在搜索结果页面也检查验证码
-            current_page = self.browser_manager.page
-            self.browser_manager.page = search_results_page  # 临时切换页面进行检查
-            has_verification = await self._check_for_captcha()
-            self.browser_manager.page = current_page  # 恢复原页面
+                # 在搜索结果页面也检查验证码
+                current_page = self.browser_manager.page
+                self.browser_manager.page = search_results_page  # 临时切换页面进行检查
+                has_verification = await self._check_for_captcha()
+                self.browser_manager.page = current_page  # 恢复原页面
             
-            if has_verification:
-                self.logger.info("搜索结果页面验证已处理，继续执行...")
+                if has_verification:
+                    self.logger.info("搜索结果页面验证已处理，继续执行...")
 
-            # 点击资讯标签
-            news_tab_selector = selectors['search_results']['news_tab']
-            if news_tab_selector.startswith('//') or news_tab_selector.startswith('/'):
-                news_tab = search_results_page.locator(f"xpath={news_tab_selector}")
-            else:
-                news_tab = search_results_page.locator(news_tab_selector)
+                # 点击资讯标签
+                news_tab = search_results_page.locator(selectors['search_results']['news_tab'])
             
-            await news_tab.click()
-            self.logger.info("已点击'资讯'标签，等待文章列表加载...")
-            await asyncio.sleep(2)
+                await news_tab.click()
+                self.logger.info("已点击'资讯'标签，等待文章列表加载...")
+                try:
+                    await self._wait_for_article_links(search_results_page)
+                except Exception as e:
+                    self.logger.warning(f"等待文章列表加载超时，继续尝试抓取: {e}")
 
             # 2. 循环抓取和翻页
             all_articles_data = []
             page_count = 0
             max_pages_to_scrape = self.config.get('scraping', {}).get('max_pages', 5)
+            link_selectors = selectors.get('search_results', {}).get('article_links') or []
+            page_refresh_timeout = self.config.get('timeouts', {}).get('element_wait', 15) * 1000
 
             while len(all_articles_data) < max_articles and page_count < max_pages_to_scrape:
                 page_count += 1
@@ -269,16 +436,20 @@ class ToutiaoScraper:
                 next_button_found = False
                 for next_button_selector in next_button_selectors:
                     try:
-                        if next_button_selector.startswith('//') or next_button_selector.startswith('/'):
-                            next_button = search_results_page.locator(f"xpath={next_button_selector}")
-                        else:
-                            next_button = search_results_page.locator(next_button_selector)
+                        next_button = search_results_page.locator(next_button_selector)
                         
                         if await next_button.is_visible():
                             self.logger.info(f"点击'下一页'按钮... (使用选择器: {next_button_selector})")
+                            first_href = await search_results_page.evaluate(_FIRST_ARTICLE_HREF_JS, link_selectors)
                             await next_button.click()
                             await search_results_page.wait_for_load_state('domcontentloaded')
-                            await asyncio.sleep(3) # 等待页面内容刷新
+                            # 等到结果列表真正刷新（第一条链接变化）再抓取，而不是固定等待
+                            try:
+                                await search_results_page.wait_for_function(
+                                    _RESULTS_CHANGED_JS, arg=[link_selectors, first_href], timeout=page_refresh_timeout
+                                )
+                            except Exception as e:
+                                self.logger.warning(f"等待翻页后的结果刷新超时，继续尝试抓取: {e}")
                             next_button_found = True
                             break
                     except Exception as e:
@@ -299,6 +470,51 @@ class ToutiaoScraper:
                 await search_results_page.close()
                 self.logger.info("搜索结果标签页已关闭。")
 
+    async def _wait_for_article_links(self, page: Page):
+        """等待结果页出现文章链接（任一选择器匹配即可），超时或未配置选择器时抛出异常"""
+        links = None
+        for selector in self.config.get('selectors', {}).get('search_results', {}).get('article_links') or []:
+            locator = page.locator(selector)
+            links = locator if links is None else links.or_(locator)
+        if links is None:
+            raise ValueError("配置中没有文章链接选择器")
+        timeout = self.config.get('timeouts', {}).get('element_wait', 15)
+        await links.first.wait_for(state='attached', timeout=timeout * 1000)
+
+    async def _open_search_results_directly(self, context, keyword: str) -> Optional[Page]:
+        """
+        直接打开资讯频道的搜索结果页，省去首页输入、等待新标签页和点击'资讯'标签的步骤。
+        页面上找不到文章链接时关闭该页并返回None，由调用方回退到首页搜索流程。
+        """
+        search_base = self.config.get('urls', {}).get('search_base') or _DEFAULT_SEARCH_BASE
+        query = urlencode({"keyword": keyword, **_DIRECT_SEARCH_PARAMS}, quote_via=quote)
+        url = f"{urljoin(search_base, _DIRECT_SEARCH_PATH)}?{query}"
+        self.logger.info(f"直接打开搜索结果页: {url}")
+        results_page = await context.new_page()
+        try:
+            await results_page.goto(url, wait_until='domcontentloaded')
+            
+            # 在搜索结果页面也检查验证码
+            current_page = self.browser_manager.page
+            self.browser_manager.page = results_page  # 临时切换页面进行检查
+            try:
+                has_verification = await self._check_for_captcha()
+            finally:
+                self.browser_manager.page = current_page  # 恢复原页面
+            if has_verification:
+                self.logger.info("搜索结果页面验证已处理，继续执行...")
+            
+            # 任一文章链接选择器匹配到元素，即说明结果页可用
+            await self._wait_for_article_links(results_page)
+            
+            self.logger.info("搜索结果页已直接打开。")
+            return results_page
+        except Exception as e:
+            self.logger.warning(f"直接打开搜索结果页失败，回退到首页搜索: {e}")
+            if not results_page.is_closed():
+                await results_page.close()
+            return None
+
     async def _scrape_current_page(self, page: Page, max_count: int) -> List[Dict[str, Any]]:
         """从当前页面提取文章数据，会依次尝试配置文件中提供的多个选择器。"""
         possible_selectors = self.config.get('selectors', {}).get('search_results', {}).get('article_links')
@@ -307,23 +523,25 @@ class ToutiaoScraper:
             self.logger.error("配置错误：'article_links' 应该是一个选择器列表（list）。")
             return []
 
-        # 找到第一个有效的选择器
+        # 上次在同一站点成功的选择器放到最前面，未命中时仍按原顺序尝试其余选择器
+        host = urlparse(page.url).netloc
+        cached_selector = self._article_selector_by_host.get(host)
+        if cached_selector in possible_selectors:
+            possible_selectors = [cached_selector] + [s for s in possible_selectors if s != cached_selector]
+
+        # 找到第一个有效的选择器；匹配成功后一次调用取回所有链接的href（已去空、去重），不再逐个定位元素
         valid_selector = None
-        count = 0
+        raw_hrefs = []
         for selector in possible_selectors:
             self.logger.info(f"正在尝试使用选择器: {selector}")
             try:
-                # 支持XPath选择器
-                if selector.startswith('//') or selector.startswith('/'):
-                    await page.wait_for_selector(f"xpath={selector}", state='attached', timeout=5000)
-                    count = await page.locator(f"xpath={selector}").count()
-                else:
-                    await page.wait_for_selector(selector, state='attached', timeout=5000)
-                    count = await page.locator(selector).count()
+                await page.wait_for_selector(selector, state='attached', timeout=5000)
+                raw_hrefs = await page.locator(selector).evaluate_all(_COLLECT_HREFS_JS)
                 
-                if count > 0:
-                    self.logger.info(f"选择器 '{selector}' 成功找到 {count} 个链接。")
+                if raw_hrefs:
+                    self.logger.info(f"选择器 '{selector}' 成功找到 {len(raw_hrefs)} 个链接。")
                     valid_selector = selector
+                    self._article_selector_by_host[host] = selector
                     break
             except Exception:
                 self.logger.warning(f"选择器 '{selector}' 失败或超时，尝试下一个。")
@@ -333,73 +551,60 @@ class ToutiaoScraper:
             return []
 
         try:
-            # 修复逻辑：先尝试抓取当前页面的所有链接，而不是只抓取max_count个
-            all_articles_data = []
-            self.logger.info(f"当前页面共找到 {count} 个链接，将逐个尝试抓取（跳过内容太短的文章）。")
-
-            for i in range(count):  # 遍历所有链接，而不是限制数量
-                # 如果已经抓取到足够的文章，停止抓取
-                if len(all_articles_data) >= max_count:
-                    self.logger.info(f"已抓取到 {len(all_articles_data)} 篇有效文章，达到当前页面目标数量。")
-                    break
-                    
-                self.logger.info(f"--- 准备处理第 {i + 1}/{count} 个链接 ---")
-                
-                # 在每次交互前重新定位元素，确保获取到的是最新的状态
-                if valid_selector.startswith('//') or valid_selector.startswith('/'):
-                    current_link_locator = page.locator(f"xpath={valid_selector}").nth(i)
-                else:
-                    current_link_locator = page.locator(valid_selector).nth(i)
-                
-                # 等待元素可见
-                try:
-                    await current_link_locator.wait_for(state='visible', timeout=10000)
-                except Exception as e:
-                    self.logger.warning(f"第 {i+1} 个链接元素不可见，跳过: {e}")
-                    continue
-                
-                href = await current_link_locator.get_attribute('href')
-                if not href:
-                    self.logger.warning(f"第 {i+1} 个链接没有href属性，跳过。")
-                    continue
-                
+            links = []
+            for href in raw_hrefs:
                 # 处理相对链接
                 if href.startswith('/'):
                     href = f"https://www.toutiao.com{href}"
                 elif not href.startswith('http'):
                     href = f"https://www.toutiao.com/{href}"
-                
-                self.logger.info(f"第 {i+1} 个链接地址: {href}")
-
-                # 点击链接，并等待新页面
-                try:
-                    async with page.context.expect_page(timeout=30000) as article_page_info:
-                        # 滚动到元素并点击
-                        await current_link_locator.scroll_into_view_if_needed()
-                        await asyncio.sleep(0.5)
-                        await current_link_locator.click()
-                    
-                    article_page = await article_page_info.value
-                    await article_page.wait_for_load_state()
-                    self.logger.info("已捕获文章详情新标签页。")
-                except Exception as e:
-                    self.logger.error(f"点击第 {i+1} 个链接失败: {e}")
-                    continue
-
-                try:
-                    # 在新标签页中提取内容
-                    article_data = await self.extract_article_content(article_page, article_page.url)
+                links.append(href)
+            
+            scraping_config = self.config.get('scraping', {})
+            concurrency = max(1, scraping_config.get('max_concurrent_articles', 3))
+            delay = scraping_config.get('delay_between_requests', 2)
+            self.logger.info(f"当前页面共找到 {len(links)} 个链接，将以 {concurrency} 个标签页并发抓取（跳过内容太短的文章）。")
+            
+            semaphore = asyncio.Semaphore(concurrency)
+            
+            async def fetch(i: int, href: str):
+                async with semaphore:
+                    self.logger.info(f"--- 开始处理第 {i + 1}/{len(links)} 个链接: {href} ---")
+                    article_data = None
+                    article_page = await page.context.new_page()
+                    try:
+                        await article_page.goto(href, wait_until='domcontentloaded', timeout=30000)
+                        article_data = await self.extract_article_content(article_page, article_page.url)
+                    except Exception as e:
+                        self.logger.error(f"打开第 {i + 1} 个链接失败: {e}")
+                    finally:
+                        # 确保文章页被关闭
+                        if not article_page.is_closed():
+                            await article_page.close()
+                    # 每个标签页处理完一篇后仍保留请求间隔，避免请求过于密集
+                    await asyncio.sleep(delay)
+                    return i, article_data
+            
+            tasks = [asyncio.create_task(fetch(i, href)) for i, href in enumerate(links)]
+            collected = []
+            try:
+                for next_done in asyncio.as_completed(tasks):
+                    i, article_data = await next_done
                     if article_data:
-                        all_articles_data.append(article_data)
-                finally:
-                    # 确保文章页被关闭
-                    if not article_page.is_closed():
-                        await article_page.close()
-                        self.logger.info("文章详情标签页已关闭，返回搜索结果页。")
-                
-                await asyncio.sleep(self.config.get('scraping', {}).get('delay_between_requests', 2))
-
-            return all_articles_data
+                        collected.append((i, article_data))
+                        # 如果已经抓取到足够的文章，停止抓取
+                        if len(collected) >= max_count:
+                            self.logger.info(f"已抓取到 {len(collected)} 篇有效文章，达到当前页面目标数量。")
+                            break
+            finally:
+                # 取消尚未完成的抓取（包括还在排队的），并等待它们关闭各自的标签页
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+            
+            # 按链接在页面中的顺序返回
+            collected.sort(key=lambda item: item[0])
+            return [article_data for _, article_data in collected]
         
         except Exception as e:
             self.logger.error(f"从结果页面提取文章链接时出错: {e}", exc_info=True)
@@ -433,80 +638,25 @@ class ToutiaoScraper:
             return None
 
     async def _extract_text_by_selectors(self, page: Page, selectors: List[str]) -> str:
-        """根据选择器列表提取第一个匹配的文本内容。"""
-        for selector in selectors:
-            try:
-                # 支持XPath选择器  
-                if selector.startswith('//') or selector.startswith('/'):
-                    locator = page.locator(f"xpath={selector}").first
-                else:
-                    locator = page.locator(selector).first
-                    
-                if await locator.is_visible(timeout=2000):
-                    text = await locator.inner_text()
-                    if text and text.strip():
-                        # 清理文本内容，移除图片相关的备注
-                        cleaned_text = self._clean_article_text(text.strip())
-                        return cleaned_text
-            except Exception as e:
-                self.logger.debug(f"选择器 {selector} 提取文本失败: {e}")
-                continue
+        """根据选择器列表提取第一个匹配的文本内容（所有选择器在一次页面调用中依次尝试）。"""
+        try:
+            text = await page.evaluate(_FIRST_TEXT_JS, selectors)
+        except Exception as e:
+            self.logger.debug(f"选择器 {selectors} 提取文本失败: {e}")
+            return ""
+        if text and text.strip():
+            # 清理文本内容，移除图片相关的备注
+            return self._clean_article_text(text.strip())
         return ""
     
     def _clean_article_text(self, text: str) -> str:
         """清理文章文本，移除图片备注等无关内容"""
-        import re
-        
-        # 移除常见的图片备注文字 - 使用句子边界来精确匹配
-        patterns_to_remove = [
-            r'图片来源于网络[，。、]*[^。！？\n]*[。！？]?',
-            r'图片来源：[^。！？\n]*[。！？]?',
-            r'图源：[^。！？\n]*[。！？]?',
-            r'配图来源[^。！？\n]*[。！？]?',
-            r'（图片来源[^）]*）',
-            r'\(图片来源[^)]*\)',
-            r'【图片来源[^】]*】',
-            r'图片版权归[^。！？\n]*[。！？]?',
-            r'图片仅供参考[^。！？\n]*[。！？]?',
-            r'图片与内容无关[^。！？\n]*[。！？]?',
-            r'图片为配图[^。！？\n]*[。！？]?',
-            r'网络配图[。！？]?',
-            r'图片来自网络[^。！？\n]*[。！？]?',
-            r'图片素材来源[^。！？\n]*[。！？]?',
-            r'图片来源网络[^。！？\n]*[。！？]?',
-            r'图片来源：网络[^。！？\n]*[。！？]?',
-            r'图片来源于网络，如有侵权请联系删除[^。！？\n]*[。！？]?',
-            r'图片来源网络，如有侵权请联系删除[^。！？\n]*[。！？]?',
-            r'图片来源于网络，侵删[^。！？\n]*[。！？]?',
-            r'图片来源网络，侵删[^。！？\n]*[。！？]?'
-        ]
-        
-        cleaned_text = text
-        for pattern in patterns_to_remove:
-            cleaned_text = re.sub(pattern, '', cleaned_text, flags=re.IGNORECASE)
-        
-        # 清理空的括号和方括号
-        cleaned_text = re.sub(r'（\s*）', '', cleaned_text)
-        cleaned_text = re.sub(r'【\s*】', '', cleaned_text)
-        cleaned_text = re.sub(r'\(\s*\)', '', cleaned_text)
-        cleaned_text = re.sub(r'\[\s*\]', '', cleaned_text)
-        
-        # 修复因删除内容导致的语法问题
-        cleaned_text = re.sub(r'(\w+)（\s*(\w+)', r'\1\2', cleaned_text)
+        # 移除常见的图片备注文字
+        cleaned_text = _IMAGE_NOTE_RE.sub('', text)
         
-        # 清理标点符号
-        cleaned_text = re.sub(r'[，。、]*\s*[，。、]+', '，', cleaned_text)
-        cleaned_text = re.sub(r'，\s*。', '。', cleaned_text)
-        cleaned_text = re.sub(r'，\s*，', '，', cleaned_text)
-        cleaned_text = re.sub(r'。\s*。', '。', cleaned_text)
-        
-        # 清理空格和换行
-        cleaned_text = re.sub(r'\n\s*\n', '\n\n', cleaned_text)
-        cleaned_text = re.sub(r'[ \t]+', ' ', cleaned_text)
-        
-        # 移除开头和结尾的多余标点
-        cleaned_text = re.sub(r'^[，。、\s]+', '', cleaned_text)
-        cleaned_text = re.sub(r'[，。、\s]+$', '', cleaned_text)
+        # 清理空括号、修复语法、清理标点和空白、去除首尾多余标点
+        for pattern, replacement in _CLEANUP_RULES:
+            cleaned_text = pattern.sub(replacement, cleaned_text)
         
         # 确保句子以正确的标点结尾
         if cleaned_text and not cleaned_text.endswith(('。', '！', '？')):
@@ -515,36 +665,14 @@ class ToutiaoScraper:
         return cleaned_text.strip()
     
     async def _extract_article_images_with_referer(self, page: Page, selectors: List[str]) -> List[Dict[str, str]]:
-        """根据选择器列表提取所有匹配的图片链接。"""
-        images = []
+        """根据选择器列表提取第一个有图片的选择器所匹配的全部图片链接。"""
         referer_url = page.url
-        for selector in selectors:
-            try:
-                # 支持XPath选择器
-                if selector.startswith('//') or selector.startswith('/'):
-                    locator = page.locator(f"xpath={selector}")
-                else:
-                    locator = page.locator(selector)
-                
-                # 检查选择器本身是否存在于页面上
-                if await locator.count() > 0:
-                    for img_locator in await locator.all():
-                        try:
-                            if src := await img_locator.get_attribute('src'):
-                                if src.startswith('http'):
-                                    images.append({'url': src, 'referer': referer_url})
-                                elif src.startswith('//'):
-                                    images.append({'url': f'https:{src}', 'referer': referer_url})
-                        except Exception as e:
-                            self.logger.debug(f"提取图片链接失败: {e}")
-                            continue
-                    # 如果这个选择器找到了图片，就没必要再试其他的了
-                    if images:
-                        return images
-            except Exception as e:
-                self.logger.debug(f"选择器 {selector} 查找图片失败: {e}")
-                continue
-        return images
+        try:
+            srcs = await page.evaluate(_IMAGE_SRCS_JS, selectors)
+        except Exception as e:
+            self.logger.debug(f"选择器 {selectors} 查找图片失败: {e}")
+            return []
+        return [{'url': f'https:{src}' if src.startswith('//') else src, 'referer': referer_url} for src in srcs]
     
     async def cleanup(self):
         """执行清理操作"""
@@ -566,10 +694,7 @@ class ToutiaoScraper:
             
             for selector in verification_selectors:
                 try:
-                    if selector.startswith('//') or selector.startswith('/'):
-                        locator = page.locator(f"xpath={selector}")
-                    else:
-                        locator = page.locator(selector)
+                    locator = page.locator(selector)
                     
                     if await locator.is_visible(timeout=2000):
                         self.logger.warning(f"🚨 检测到人工验证元素: {selector}")
@@ -609,10 +734,7 @@ class ToutiaoScraper:
             
             # 再次检查验证是否真的完成了
             page = self.browser_manager.page
-            if detected_selector.startswith('//') or detected_selector.startswith('/'):
-                locator = page.locator(f"xpath={detected_selector}")
-            else:
-                locator = page.locator(detected_selector)
+            locator = page.locator(detected_selector)
             
             if await locator.is_visible(timeout=5000):
                 self.logger.warning("⚠️  验证元素仍然存在，可能需要重新验证")
@@ -629,10 +751,9 @@ class ToutiaoScraper:
             raise
     
     def _clear_file(self, filename: str):
-        """如果文件存在，则清空它"""
-        if os.path.exists(filename):
-            try:
-                os.remove(filename)
-                self.logger.info(f"已清理旧文件: {filename}")
-            except OSError as e:
-                self.logger.error(f"清理文件 {filename} 失败: {e}")
\ No newline at end of file
+        """清空文件内容（以写模式打开即截断，文件不存在时创建空文件）"""
+        try:
+            open(filename, 'w').close()
+            self.logger.info(f"已清理旧文件: {filename}")
+        except OSError as e:
+            self.logger.error(f"清理文件 {filename} 失败: {e}")
\ No newline at end of file
@@ -1,17 +1,174 @@
 from PyQt6.QtCore import QThread, pyqtSignal
 import os
 import traceback
-import json
-import re
 import logging
 import asyncio
+import atexit
+import time
+import csv
+from collections import deque
 
 from .toutiao_scraper import ToutiaoScraper
 from .poe_automator import PoeAutomator
 from .monica_automator import MonicaAutomator
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple, Deque
 from .browser_manager import BrowserManager
 import pandas as pd
+import openpyxl
+
+try:
+    from python_calamine import CalamineWorkbook  # Rust实现的Excel读取，比openpyxl快数倍；未安装时回退
+except ImportError:
+    CalamineWorkbook = None
+
+# Excel状态批量写回：暂存的更新达到该条数，或距上次保存超过该秒数时写回文件
+STATUS_FLUSH_THRESHOLD = 16
+STATUS_FLUSH_INTERVAL = 5.0
+
+# 标题行数达到该值时用pandas向量化筛选，较少时直接用列表推导，省去构建DataFrame的开销
+PANDAS_ROW_THRESHOLD = 1000
+
+# 状态列中表示文章已创作完成的值
+STATUS_DONE = "已完成文章创作"
+
+# 标题列的表头文字
+_HEADER_MARKERS = frozenset({'标题', 'title', 'Title'})
+
+
+def _calamine_value(value: Any) -> Any:
+    """calamine 以空字符串表示空单元格、把所有数字读成浮点数；转换为与 openpyxl 一致的 None 和整数"""
+    if value == '':
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def read_title_rows(file_path: str) -> List[Tuple[Any, Any]]:
+    """
+    读取标题文件第一个工作表的前两列，返回 (标题, 状态) 元组列表，
+    列表下标即Excel中的行号减1，空单元格为None。csv 用标准库逐行解析；
+    Excel 文件优先用 calamine 读取（只读，写回仍用 openpyxl），未安装时 xlsx 用 openpyxl
+    只读模式逐行流式读取，openpyxl 不支持的格式（如 xls）回退到 pandas。
+    """
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext == '.csv':
+        return [
+            (row[0] if row and row[0] != '' else None, row[1] if len(row) > 1 and row[1] != '' else None)
+            for row in _read_csv(file_path)
+        ]
+    if CalamineWorkbook is not None and ext in ('.xlsx', '.xlsm', '.xls'):
+        # 保留开头的空行，使列表下标与Excel行号对应
+        sheet = CalamineWorkbook.from_path(file_path).get_sheet_by_index(0)
+        return [
+            (_calamine_value(row[0]) if row else None, _calamine_value(row[1]) if len(row) > 1 else None)
+            for row in sheet.to_python(skip_empty_area=False)
+        ]
+    if ext in ('.xlsx', '.xlsm'):
+        wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            return [
+                (row[0], row[1] if len(row) > 1 else None)
+                for row in wb.worksheets[0].iter_rows(max_col=2, values_only=True)
+            ]
+        finally:
+            wb.close()
+    # 解析时就只取前两列，后面的列不会被读出；文件只有一列时 reindex 补出状态列
+    df = pd.read_excel(file_path, header=None, usecols=lambda col: col in (0, 1)).reindex(columns=[0, 1])
+    df = df.astype(object).where(df.notna(), None)
+    return list(zip(df[0].tolist(), df[1].tolist()))
+
+
+def plain_title_sheet_rows(wb) -> Optional[List[List[Any]]]:
+    """
+    检查已完整加载的工作簿是否为纯标题表：只有一个工作表、不超过两列，且没有单元格样式、列宽行高、
+    合并单元格、条件格式、数据验证、批注、超链接、图片图表、冻结窗格、筛选和定义名称等
+    流式重写会丢失的内容。是纯标题表时返回各行的原始单元格值（保留整数、日期、公式等原类型），否则返回None。
+    """
+    if len(wb.worksheets) != 1 or wb.chartsheets or len(wb.defined_names):
+        return None
+    ws = wb.worksheets[0]
+    if (ws.max_column > 2 or ws.merged_cells.ranges or list(ws.conditional_formatting)
+            or ws.data_validations.dataValidation or ws._images or ws._charts
+            or ws.freeze_panes or ws.auto_filter.ref or len(ws.column_dimensions)):
+        return None
+    if any(dim.customHeight or dim.hidden or dim.outlineLevel for dim in ws.row_dimensions.values()):
+        return None
+    rows = []
+    for row in ws.iter_rows(max_col=2):
+        if any(cell.has_style or cell.hyperlink or cell.comment for cell in row):
+            return None
+        rows.append([cell.value for cell in row])
+    return rows
+
+
+def _read_csv(file_path: str) -> List[List[str]]:
+    """读取CSV的所有行；优先按UTF-8（可带BOM）解码，失败时按Excel中文环境常用的GBK解码"""
+    try:
+        with open(file_path, newline='', encoding='utf-8-sig') as f:
+            return list(csv.reader(f))
+    except UnicodeDecodeError:
+        with open(file_path, newline='', encoding='gbk') as f:
+            return list(csv.reader(f))
+
+
+def update_csv_status(file_path: str, updates: Dict[int, str]):
+    """
+    将状态写入CSV第二列并整体写回。CSV读写都是纯文本处理，没有Excel的压缩包和XML开销；
+    重新读取原文件可保留第二列之后的其他列。以带BOM的UTF-8写出，Excel可直接打开。
+    """
+    rows = _read_csv(file_path)
+    for row_index, status in updates.items():
+        if row_index < len(rows):
+            row = rows[row_index]
+            if len(row) < 2:
+                row.extend([''] * (2 - len(row)))
+            row[1] = status
+    with open(file_path, 'w', newline='', encoding='utf-8-sig') as f:
+        csv.writer(f).writerows(rows)
+
+
+def write_title_rows(file_path: str, rows: List[List[Any]], sheet_name: str):
+    """用 openpyxl 的 write_only 模式逐行写出纯标题表的各行，不为每个单元格构建对象模型"""
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet(sheet_name)
+    for row in rows:
+        ws.append(row)
+    wb.save(file_path)
+
+
+def has_title_header(first_row: Tuple[Any, Any]) -> bool:
+    """首行第一列是"标题"/"title"等表头文字时视为表头行（非字符串单元格不可能是表头，无需转换）"""
+    value = first_row[0]
+    return isinstance(value, str) and value.strip() in _HEADER_MARKERS
+
+
+def select_pending_titles(rows: List[Tuple[Any, Any]]) -> List[Tuple[int, str]]:
+    """
+    从 read_title_rows 的结果中筛选待处理的任务：标题非空且状态（忽略首尾空白）不是已完成。
+    返回 (行索引, 标题) 列表，行索引与Excel中的行一一对应。首行是表头时跳过。
+    """
+    # 表头检测直接看已读出的首行，不需要再读一次文件
+    start = 1 if rows and has_title_header(rows[0]) else 0
+    if len(rows) < PANDAS_ROW_THRESHOLD:
+        return [
+            (i, str(title)) for i, (title, status) in enumerate(rows[start:], start)
+            if title is not None and (status is None or str(status).strip() != STATUS_DONE)
+        ]
+    # 行数较多时用布尔掩码一次筛选，状态列的空值填充与去空白都在向量化操作中完成
+    df = pd.DataFrame(rows, columns=[0, 1]).iloc[start:]
+    mask = df[0].notna() & df[1].fillna('').astype(str).str.strip().ne(STATUS_DONE)
+    pending = df.loc[mask, 0].astype(str)
+    return list(zip(pending.index.tolist(), pending.tolist()))
+
+
+def _is_non_empty_file(path: str) -> bool:
+    """文件存在且有内容（清理后的文件保留为空文件，不能只判断是否存在）"""
+    try:
+        return os.stat(path).st_size > 0
+    except OSError:
+        return False
+
 
 class WorkflowThread(QThread):
     """
@@ -22,11 +179,30 @@ class WorkflowThread(QThread):
     error = pyqtSignal(str)
     log_signal = pyqtSignal(str) # 信号必须是类属性
 
-    def __init__(self, config: Dict[str, Any]):
+    def __init__(self, config: Dict[str, Any], title_rows: Optional[List[Tuple[Any, Any]]] = None):
+        """
+        Args:
+            config: 工作流配置
+            title_rows: 调用方已用 read_title_rows 读出的标题行；提供时不再重复读取标题文件
+        """
         super().__init__()
         self.config = config
+        self._preloaded_title_rows = title_rows
         self.browser_manager = BrowserManager(headless=self.config.get('headless', True))
         self.logger = self._setup_logging()
+        # 状态回写使用的工作簿：首次更新时打开并保留，之后只修改单元格
+        # 标题文件路径，加载标题时设置
+        self.excel_file_path: Optional[str] = None
+        self._status_is_csv = False
+        self._excel_wb = None
+        # 加载时读到的 (标题, 状态) 行，用于筛选任务和跳过未变化的状态
+        self._title_rows: Optional[List[Tuple[Any, Any]]] = None
+        # 纯标题表的工作表名和按原类型保存的各行（首次写回时检测，非纯标题表时工作表名为空串）
+        self._plain_sheet_name: Optional[str] = None
+        self._plain_rows: Optional[List[List[Any]]] = None
+        # 尚未写回文件的状态更新：Excel行索引 -> 状态
+        self._pending_status: Dict[int, str] = {}
+        self._last_status_flush = time.monotonic()
 
     def _setup_logging(self):
         """设置日志记录器"""
@@ -62,15 +238,21 @@ class WorkflowThread(QThread):
                 return
             self.log_signal.emit("浏览器启动成功。")
             
-            titles = self._load_titles_from_excel(self.config['title_path'])
-            if not titles:
+            tasks = self._load_titles_from_excel(self.config['title_path'])
+            if not tasks:
                 self.log_signal.emit("Excel文件中没有找到标题，任务结束。")
                 return
 
-            self.log_signal.emit(f"成功加载 {len(titles)} 个任务标题。")
+            total = len(tasks)
+            self.log_signal.emit(f"成功加载 {total} 个任务标题。")
 
-            for index, title in enumerate(titles):
-                self.log_signal.emit(f"\n--- 开始处理任务 {index + 1}/{len(titles)}: {title} ---")
+            position = 0
+            toutiao_scraper = None
+            while tasks:
+                # 每个任务为 (Excel行索引, 标题)，按顺序取出
+                row_index, title = tasks.popleft()
+                position += 1
+                self.log_signal.emit(f"\n--- 开始处理任务 {position}/{total}: {title} ---")
                 
                 # 清理旧的输出文件
                 self._clear_file("article.txt")
@@ -81,7 +263,9 @@ class WorkflowThread(QThread):
 
                 if should_scrape_articles or should_scrape_images:
                     self.log_signal.emit("正在启动今日头条抓取器...")
-                    toutiao_scraper = ToutiaoScraper(self.config, self.browser_manager)
+                    # 抓取器只创建一次，各任务共用（图片处理器等资源随之复用）
+                    if toutiao_scraper is None:
+                        toutiao_scraper = ToutiaoScraper(self.config, self.browser_manager)
                     success = await toutiao_scraper.scrape_articles_and_images(
                         keyword=title,
                         scrape_articles=should_scrape_articles,
@@ -102,7 +286,7 @@ class WorkflowThread(QThread):
                         self.log_signal.emit(f"警告：自定义附件路径不存在: {custom_path}")
                     else:
                         self.log_signal.emit("警告：自定义附件路径为空")
-                elif should_scrape_articles and os.path.exists("article.txt"):
+                elif should_scrape_articles and _is_non_empty_file("article.txt"):
                     article_to_upload = "article.txt"
                     self.log_signal.emit("使用抓取的文章作为附件: article.txt")
                 
@@ -124,13 +308,13 @@ class WorkflowThread(QThread):
                     workflow_success = False
                 
                 if workflow_success:
-                     self.log_signal.emit(f"--- 任务 {index + 1}/{len(titles)} 完成 ---\n")
+                     self.log_signal.emit(f"--- 任务 {position}/{total} 完成 ---\n")
                      # 更新Excel状态
-                     self._update_excel_status(index, "已完成文章创作")
+                     self._update_excel_status(row_index, STATUS_DONE)
                 else:
-                    self.log_signal.emit(f"--- 任务 {index + 1}/{len(titles)} 失败 ---\n")
+                    self.log_signal.emit(f"--- 任务 {position}/{total} 失败 ---\n")
                     # 更新Excel状态
-                    self._update_excel_status(index, "创作失败")
+                    self._update_excel_status(row_index, "创作失败")
 
                 await asyncio.sleep(2) # 每个任务之间的短暂延迟
 
@@ -139,6 +323,8 @@ class WorkflowThread(QThread):
             traceback.print_exc()
             self.error.emit(f"工作流执行失败: {e}")
         finally:
+            self._flush_excel_status()
+            atexit.unregister(self._flush_excel_status)
             await self.cleanup()
             self.log_signal.emit("所有任务已完成。")
             self.finished.emit("工作流已完成")
@@ -222,76 +408,115 @@ class WorkflowThread(QThread):
                 # EPIPE错误是常见的，不应该影响整体流程
         self.log_signal.emit("浏览器已关闭。")
 
-    def _load_titles_from_excel(self, file_path: str) -> List[str]:
+    def _load_titles_from_excel(self, file_path: str) -> Deque[Tuple[int, str]]:
+        """加载待处理任务，返回 (Excel行索引, 标题) 队列"""
         if not file_path or not os.path.exists(file_path):
             self.log_signal.emit(f"Excel文件路径无效或文件不存在: {file_path}")
-            return []
+            return deque()
         try:
-            # 读取完整的Excel文件
-            df = pd.read_excel(file_path, header=None)
-            
-            # 获取第一列的标题
-            titles = df[0].dropna().astype(str).tolist()
-            
-            # 检查是否有状态列，只处理未完成的任务
-            if len(df.columns) >= 2:
-                statuses = df[1].fillna('').astype(str).tolist()
-                # 创建待处理任务列表，包含索引信息
-                pending_tasks = []
-                for i, title in enumerate(titles):
-                    if i < len(statuses):
-                        status = statuses[i]
-                        if status != "已完成文章创作":
-                            pending_tasks.append((i, title))
-                    else:
-                        # 没有状态的任务视为待处理
-                        pending_tasks.append((i, title))
-                
-                # 保存任务索引映射
-                self.task_indices = [task[0] for task in pending_tasks]
-                titles = [task[1] for task in pending_tasks]
-                
-                self.log_signal.emit(f"从Excel文件加载 {len(titles)} 个待处理任务（跳过已完成任务）。")
+            # 空标题行和已完成的行被跳过，保留的行索引即Excel中的实际行
+            if self._preloaded_title_rows is not None:
+                self._title_rows, self._preloaded_title_rows = self._preloaded_title_rows, None
             else:
-                # 没有状态列，所有任务都是待处理的
-                self.task_indices = list(range(len(titles)))
-                self.log_signal.emit(f"从Excel文件成功加载 {len(titles)} 个标题。")
+                self._title_rows = read_title_rows(file_path)
+            tasks = deque(select_pending_titles(self._title_rows))
+            
+            self.log_signal.emit(f"从Excel文件加载 {len(tasks)} 个待处理任务（跳过已完成任务）。")
             
             # 保存Excel文件路径供后续更新状态使用
             self.excel_file_path = file_path
-            return titles
+            self._status_is_csv = file_path.lower().endswith('.csv')
+            # 进程意外退出时也把暂存的状态写回
+            atexit.register(self._flush_excel_status)
+            return tasks
         except Exception as e:
             self.log_signal.emit(f"读取Excel文件时发生错误: {e}")
-            return []
+            return deque()
 
-    def _update_excel_status(self, task_index: int, status: str):
-        """更新Excel文件中对应行的状态"""
-        if not hasattr(self, 'excel_file_path') or not self.excel_file_path:
+    def _update_excel_status(self, excel_row_index: int, status: str):
+        """
+        记录Excel中对应行的新状态。状态先暂存在内存中，
+        累计达到阈值或距上次保存超过一定时间后才批量写回文件。
+        """
+        if not self.excel_file_path:
             return
         
+        # 内存中的行与文件保持一致；状态未变化（如重复标记同一行）时无需写回
+        rows = self._title_rows
+        if rows is not None and excel_row_index < len(rows):
+            if rows[excel_row_index][1] == status:
+                return
+            rows[excel_row_index] = (rows[excel_row_index][0], status)
+        
+        self._pending_status[excel_row_index] = status
+        self.log_signal.emit(f"已记录Excel状态: 第{excel_row_index + 1}行 -> {status}")
+        
+        if (len(self._pending_status) >= STATUS_FLUSH_THRESHOLD
+                or time.monotonic() - self._last_status_flush >= STATUS_FLUSH_INTERVAL):
+            self._flush_excel_status()
+
+    def _get_status_sheet(self):
+        """返回标题所在的工作表（第一个工作表），工作簿只在首次调用时打开"""
+        if self._excel_wb is None:
+            self._excel_wb = openpyxl.load_workbook(self.excel_file_path)
+        return self._excel_wb.worksheets[0]
+
+    def _detect_plain_title_sheet(self):
+        """
+        首次写回时检查标题文件能否整表流式重写：只有确认为纯标题表的 xlsx 才走重写，
+        其余文件（含xlsm等）保留已打开的工作簿，原地修改状态单元格。
+        """
+        self._plain_sheet_name = ''
+        if os.path.splitext(self.excel_file_path)[1].lower() != '.xlsx':
+            return
+        ws = self._get_status_sheet()
         try:
-            # 获取实际的Excel行索引
-            if hasattr(self, 'task_indices') and task_index < len(self.task_indices):
-                excel_row_index = self.task_indices[task_index]
-            else:
-                excel_row_index = task_index
-            
-            # 读取整个Excel文件
-            df = pd.read_excel(self.excel_file_path, header=None)
-            
-            # 确保第二列存在，如果不存在则创建
-            if len(df.columns) < 2:
-                df[1] = ''
+            rows = plain_title_sheet_rows(self._excel_wb)
+        except Exception as e:
+            # 无法确认时按非纯标题表处理
+            self.logger.warning(f"检查标题文件结构失败，改为原地更新状态单元格: {e}")
+            rows = None
+        if rows is not None:
+            self._plain_sheet_name = ws.title
+            self._plain_rows = rows
+            # 之后都流式重写，不再需要完整的工作簿对象
+            self._excel_wb = None
+
+    def _flush_excel_status(self):
+        """将暂存的状态一次性写入工作簿单元格（第二列）并保存，多次更新只保存一次文件"""
+        self._last_status_flush = time.monotonic()
+        if not self._pending_status:
+            return
+        
+        pending, self._pending_status = self._pending_status, {}
+        try:
+            if self._status_is_csv:
+                update_csv_status(self.excel_file_path, pending)
+                self.log_signal.emit(f"已保存 {len(pending)} 条状态更新。")
+                return
             
-            # 更新对应行的状态（第二列）
-            if excel_row_index < len(df):
-                df.iloc[excel_row_index, 1] = status
-                
-                # 保存回Excel文件
-                df.to_excel(self.excel_file_path, index=False, header=False)
-                self.log_signal.emit(f"已更新Excel状态: 第{excel_row_index + 1}行 -> {status}")
+            if self._plain_sheet_name is None:
+                self._detect_plain_title_sheet()
             
+            if self._plain_sheet_name:
+                # 纯标题表：在按原类型保存的行上更新状态，以 write_only 模式流式重写整个文件
+                rows = self._plain_rows
+                for excel_row_index, status in pending.items():
+                    if excel_row_index < len(rows):
+                        rows[excel_row_index][1] = status
+                write_title_rows(self.excel_file_path, rows, self._plain_sheet_name)
+            else:
+                # 含其他工作表或列时，只修改状态单元格，保留文件中的其余内容
+                ws = self._get_status_sheet()
+                for excel_row_index, status in pending.items():
+                    if excel_row_index < ws.max_row:
+                        ws.cell(row=excel_row_index + 1, column=2, value=status)
+                self._excel_wb.save(self.excel_file_path)
+            self.log_signal.emit(f"已保存 {len(pending)} 条Excel状态更新。")
         except Exception as e:
+            # 保存失败时放回暂存区（保留期间产生的更新），下次再试
+            pending.update(self._pending_status)
+            self._pending_status = pending
             self.log_signal.emit(f"更新Excel状态失败: {e}")
 
     def _save_article(self, title: str, content: str):
@@ -334,8 +559,6 @@ class WorkflowThread(QThread):
         """
         将图片链接分别插入到二级标题后面
         """
-        import re
-        
         lines = content.split('\n')
         result_lines = []
         picture_index = 0
@@ -363,9 +586,9 @@ class WorkflowThread(QThread):
         return '\n'.join(result_lines)
 
     def _clear_file(self, filename: str):
-        if os.path.exists(filename):
-            try:
-                os.remove(filename)
-                self.log_signal.emit(f"已清理旧文件: {filename}")
-            except OSError as e:
-                self.log_signal.emit(f"清理文件 {filename} 失败: {e}") 
\ No newline at end of file
+        # 以写模式打开即截断，文件不存在时创建空文件
+        try:
+            open(filename, 'w').close()
+            self.log_signal.emit(f"已清理旧文件: {filename}")
+        except OSError as e:
+            self.log_signal.emit(f"清理文件 {filename} 失败: {e}") 
\ No newline at end of file